@@ -0,0 +1,72 @@
+"""วัดเวลาค้นหาร้านที่ใกล้ที่สุด (geo.StoreLocator) เมื่อจำนวนร้านเพิ่มขึ้น
+
+    python bench/bench_geo.py --sizes 12,1000,10000,100000
+ใช้ร้านสมมติที่สุ่มตำแหน่งในกรุงเทพฯ เทียบ k-d tree กับการคำนวณระยะทุกร้านด้วย numpy
+และตรวจว่าผลตรงกันทุกครั้ง
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench_pipeline import summarize
+from geo import StoreLocator, unit_vectors
+
+# กรอบพื้นที่กรุงเทพฯ โดยประมาณ
+LAT_RANGE = (13.60, 13.95)
+LON_RANGE = (100.35, 100.85)
+
+
+class FakeRecord:
+    __slots__ = ("lat", "lon")
+
+    def __init__(self, lat, lon):
+        self.lat = lat
+        self.lon = lon
+
+
+def random_points(rng, size):
+    return rng.uniform(*LAT_RANGE, size), rng.uniform(*LON_RANGE, size)
+
+
+def bench_size(rng, size, queries, k):
+    lats, lons = random_points(rng, size)
+    started = time.perf_counter()
+    locator = StoreLocator([FakeRecord(lat, lon) for lat, lon in zip(lats, lons)])
+    build_seconds = time.perf_counter() - started
+    vectors = unit_vectors(lats, lons)
+
+    tree, brute, mismatches = [], [], 0
+    for lat, lon in zip(*random_points(rng, queries)):
+        started = time.perf_counter()
+        found = locator.tree.query(unit_vectors(lat, lon), k)
+        tree.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        distances = ((vectors - unit_vectors(lat, lon)) ** 2).sum(axis=1)
+        nearest = np.argpartition(distances, min(k, size) - 1)[:k]
+        expected = nearest[np.argsort(distances[nearest])]
+        brute.append(time.perf_counter() - started)
+        mismatches += [row for row, _ in found] != expected.tolist()
+    return {
+        "stores": size,
+        "build_ms": round(build_seconds * 1000, 3),
+        "kdtree": summarize(tree),
+        "brute_force": summarize(brute),
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark การค้นหาร้านใกล้ตำแหน่ง")
+    parser.add_argument("--sizes", default="12,1000,10000,100000")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    report = [
+        bench_size(rng, int(size), args.queries, args.k) for size in args.sizes.split(",")
+    ]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,81 @@
+"""วัดเวลา render และขนาด payload ของคำตอบที่เป็นรายการร้าน (reply_pages) ต่อหนึ่งหน้า
+
+    python bench/bench_pages.py --sizes 12,100,1000,5000
+ขยาย data/hangout_info.csv ให้มีจำนวนร้านตามที่กำหนดแล้วแบ่งหน้าจนครบทุกร้าน ทั้งแบบ text และ flex
+single_message_chars คือความยาวถ้าส่งทั้งรายการเป็น text message เดียว (เกิน 5000 คือ LINE ไม่รับ)
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench_pipeline import git_commit, summarize
+from catalogue import StoreCatalogue
+from logical import DATA_PATH
+from reply_pages import FORMATS, Listing, paginate, text_length
+
+STYLES = ("names", "details", "recommend")
+
+
+def scaled_catalogue(base, size):
+    rows = []
+    for i in range(size):
+        fields = dict(base.records[i % len(base.records)].fields)
+        fields["ชื่อร้าน"] = f"{fields['ชื่อร้าน']} {i + 1}"
+        rows.append(fields)
+    return StoreCatalogue(base.columns, rows)
+
+
+def bench_listing(catalogue, style, output, max_items):
+    listing = Listing(style, range(len(catalogue)), header="หัวข้อ\n\n", footer="ท้ายข้อความ")
+    samples, payloads, lengths, counts = [], [], [], []
+    start = 0
+    while start is not None:
+        started = time.perf_counter()
+        page = paginate(listing, catalogue.records, start, output, max_items)
+        samples.append(time.perf_counter() - started)
+        payloads.append(page.payload_bytes)
+        counts.append(len(page.messages))
+        lengths.extend(text_length(m) for m in page.messages if isinstance(m, str))
+        start = page.next_start
+    return {
+        "pages": len(samples),
+        "render": summarize(samples),
+        "payload_bytes_p50": int(np.percentile(payloads, 50)),
+        "payload_bytes_max": max(payloads),
+        "messages_per_page_max": max(counts),
+        "text_length_max": max(lengths),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark การแบ่งหน้าคำตอบรายการร้าน")
+    parser.add_argument("--sizes", default="12,100,1000,5000")
+    parser.add_argument("--page-stores", type=int, default=0, help="เหมือน REPLY_PAGE_STORES")
+    parser.add_argument("--out", default=None, help="บันทึก JSON ลงไฟล์แทนการพิมพ์")
+    args = parser.parse_args()
+
+    base = StoreCatalogue.from_csv(DATA_PATH)
+    report = {"commit": git_commit(), "runs": []}
+    for size in [int(value) for value in args.sizes.split(",")]:
+        catalogue = scaled_catalogue(base, size)
+        run = {"stores": size}
+        for style in STYLES:
+            listing = Listing(style, range(size))
+            run[style] = {
+                "single_message_chars": sum(
+                    text_length(listing.item(catalogue.records, i)) for i in range(size)
+                ),
+                **{
+                    output: bench_listing(catalogue, style, output, args.page_stores)
+                    for output in FORMATS
+                },
+            }
+        report["runs"].append(run)
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,310 @@
+"""วัดประสิทธิภาพของ intent pipeline และ webhook แล้วพิมพ์ผลเป็น JSON
+
+รันจากโฟลเดอร์หลักของโปรเจกต์:
+    python bench/bench_pipeline.py --out bench_output.json
+ผลแต่ละส่วนมี p50/p95/p99 (มิลลิวินาที) และ requests ต่อวินาที
+เก็บ commit ไว้ในผลด้วยเพื่อเอาไปเทียบกันระหว่าง commit ได้
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+SECRET = "bench-secret"
+os.environ.setdefault("ACCESS_TOKEN", "bench-token")
+os.environ.setdefault("SECRET", SECRET)
+os.environ.setdefault("WARMUP", "lazy")
+# log ของ server ใช้ stdout เหมือนกัน ปิดไว้เพื่อให้ stdout มีแค่ผล JSON
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+# ให้กิ่ง store_search ค้นร้านด้วยโมเดลเสมอแม้โมเดลยังไม่ได้ปรับเทียบเกณฑ์ (tools/store_search_eval.py)
+os.environ.setdefault("STORE_SEARCH_MIN_SCORE", "0.5")
+
+# ข้อความตัวอย่างที่ไม่ตรงกับ corpus เป๊ะๆ เพื่อให้ต้องผ่านโมเดลจริง
+SAMPLE_UTTERANCES = [
+    "สวัสดีครับบอท",
+    "มีร้านเหล้าแถวจตุจักรไหม",
+    "ขอรายชื่อร้านหน่อย",
+    "อยากได้รายละเอียดร้าน",
+    "ช่วยแนะนำร้านให้หน่อย",
+    "ขอบคุณมากครับ",
+    "ยกเลิกก่อน",
+    "ร้านไหนดีที่สุด",
+]
+
+# ข้อความของแต่ละกิ่งคำตอบใน chat_answer เป็นวลีใน corpus จึงตรง cache เสมอถ้าไม่ปิด cache (ดู TIERS)
+BRANCHES = {
+    "greeting": ["สวัสดี"],
+    "list": ["รายชื่อร้าน"],
+    "detail": ["รายละเอียด"],
+    "recommendation": ["แนะนำร้าน", "ใช่", "ไม่ใช่", "ใช่"],
+    "cancel": ["แนะนำร้าน", "ยกเลิก"],
+    "store_search": ["ร้านที่มีดนตรีสด"],
+}
+
+
+def summarize(samples):
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def rss_mb():
+    # ru_maxrss บน Linux มีหน่วยเป็น KB
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        current = None
+    return {"current_mb": current and round(current, 1), "peak_mb": round(peak, 1)}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_similarity(logical, iterations, batch_sizes):
+    intents = logical.get_intents()
+    single = []
+    for i in range(iterations):
+        text = SAMPLE_UTTERANCES[i % len(SAMPLE_UTTERANCES)]
+        started = time.perf_counter()
+        logical.calculate_similarity_score(text, intents.combined)
+        single.append(time.perf_counter() - started)
+    result = {"single": summarize(single)}
+    for size in batch_sizes:
+        texts = [SAMPLE_UTTERANCES[i % len(SAMPLE_UTTERANCES)] for i in range(size)]
+        samples = []
+        for _ in range(max(1, iterations // size)):
+            started = time.perf_counter()
+            logical.calculate_similarity_scores(texts, intents.combined)
+            samples.append(time.perf_counter() - started)
+        stats = summarize(samples)
+        stats["per_message_ms"] = round(stats["p50_ms"] / size, 3)
+        result[f"batch_{size}"] = stats
+    return result
+
+
+# ขั้นของการจัด intent ที่ต้องการวัด: cache คือใช้ intent cache ตามปกติ,
+# lexical คือไม่มี cache (ผ่านขั้น n-gram ก่อน) และ model คือไม่มีทั้ง cache และขั้น n-gram ทุกข้อความต้อง encode
+TIERS = ("cache", "lexical", "model")
+
+
+@contextmanager
+def intent_tier(logical, tier):
+    from intent_cache import IntentCache
+
+    cache, bot_state = logical.intent_cache, logical.get_state()
+    lexical = bot_state.lexical
+    if tier != "cache":
+        # cache ที่ไม่มี corpus และขนาด 0 ไม่เก็บผลใดเลย
+        logical.intent_cache = IntentCache(max_size=0)
+    if tier == "model":
+        bot_state.lexical = None
+    try:
+        yield
+    finally:
+        logical.intent_cache = cache
+        bot_state.lexical = lexical
+
+
+def tier_counts(before):
+    from metrics import INTENT_TIER_TOTAL
+
+    return {tier: INTENT_TIER_TOTAL.value(tier) - before.get(tier, 0) for tier in TIERS}
+
+
+def bench_branches(logical, iterations):
+    result = {}
+    for name, flow in BRANCHES.items():
+        result[name] = {"messages_per_flow": len(flow)}
+        for tier in TIERS:
+            samples = []
+            before = tier_counts({})
+            with intent_tier(logical, tier):
+                for i in range(iterations):
+                    session_id = f"bench-{name}-{tier}-{i}"
+                    started = time.perf_counter()
+                    for text in flow:
+                        logical.chat_answer(text, session_id)
+                    samples.append(time.perf_counter() - started)
+            result[name][tier] = summarize(samples)
+            # จำนวนข้อความที่แต่ละขั้นตอบจริง (กิ่ง store_search encode เพิ่มเพื่อค้นร้านเสมอ)
+            result[name][tier]["classified_by"] = tier_counts(before)
+    return result
+
+
+def signed_payload(i, events_per_request):
+    events = []
+    for j in range(events_per_request):
+        # ต่อท้ายด้วยลำดับของ event ให้ทุกข้อความไม่ซ้ำกัน ไม่งั้นหลัง request แรกๆ ทุกข้อความจะตรง intent cache
+        text = f"{SAMPLE_UTTERANCES[(i + j) % len(SAMPLE_UTTERANCES)]} {i}-{j}"
+        events.append(
+            {
+                "type": "message",
+                "mode": "active",
+                "timestamp": int(time.time() * 1000),
+                "webhookEventId": f"bench-{i}-{j}",
+                "deliveryContext": {"isRedelivery": False},
+                "replyToken": f"token-{i}-{j}",
+                "source": {"type": "user", "userId": f"U{i % 50}"},
+                "message": {"type": "text", "id": f"{i}{j}", "text": text},
+            }
+        )
+    body = json.dumps({"destination": "bench", "events": events}, ensure_ascii=False)
+    digest = hmac.new(SECRET.encode(), body.encode(), hashlib.sha256).digest()
+    return body.encode(), base64.b64encode(digest).decode()
+
+
+def drive_webhook(port, payloads, concurrency):
+    """ส่ง payload ทั้งหมดไปที่ POST / ด้วย keep-alive connection ละหนึ่ง thread คืนค่า (ผลแต่ละ request, เวลารวม)"""
+    local = threading.local()
+
+    def post(payload):
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        body, signature = payload
+        started = time.perf_counter()
+        conn.request(
+            "POST",
+            "/",
+            body=body,
+            headers={"Content-Type": "application/json", "X-Line-Signature": signature},
+        )
+        response = conn.getresponse()
+        response.read()
+        return response.status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(post, payloads))
+    return results, time.perf_counter() - started
+
+
+def summarize_webhook(results, elapsed):
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    stats = summarize([latency for _, latency in results])
+    stats["requests_per_second"] = round(len(results) / elapsed, 2)
+    stats["statuses"] = statuses
+    return stats
+
+
+def bench_webhook(requests, concurrency, events_per_request, stub_faults=None):
+    from stub_line_api import start_stub
+    from werkzeug.serving import make_server
+
+    stub = start_stub(**(stub_faults or {}))
+    os.environ["LINE_API_HOST"] = stub.url
+    import main
+
+    main.start_background()
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, main.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    payloads = [signed_payload(i, events_per_request) for i in range(requests)]
+    before = tier_counts({})
+    results, elapsed = drive_webhook(server.server_port, payloads, concurrency)
+
+    # โหมด ASYNC_REPLY ตอบ 200 ก่อนส่งข้อความ ต้องรอให้คิวว่างก่อนนับข้อความที่ส่ง
+    if main.reply_pool is not None:
+        main.reply_pool.shutdown()
+    server.shutdown()
+    stats = summarize_webhook(results, elapsed)
+    stats.update(
+        {
+            "requests": requests,
+            "concurrency": concurrency,
+            "events_per_request": events_per_request,
+            "replies_sent": len(stub.received()),
+            "stub_faults": stub_faults or {},
+            "injected_errors": dict(stub.injected),
+            "async_reply": main.reply_pool is not None,
+            "classified_by": tier_counts(before),
+        }
+    )
+    stub.shutdown()
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark intent pipeline และ webhook")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--events-per-request", type=int, default=1)
+    parser.add_argument("--skip-webhook", action="store_true")
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="หน่วงคำตอบของ stub LINE API (วินาที)")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-expire-rate", type=float, default=0.0)
+    parser.add_argument("--out", default=None, help="บันทึก JSON ลงไฟล์แทนการพิมพ์")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    rss_before = rss_mb()
+    import logical
+
+    logical.warm_up()
+    report = {
+        "commit": git_commit(),
+        "encoder_backend": logical.get_model().backend,
+        "startup_timings": dict(logical.startup_timings),
+        "model_load_seconds": logical.startup_timings.get("load_model"),
+        "rss_before_model": rss_before,
+        "rss_after_model": rss_mb(),
+        "similarity": bench_similarity(
+            logical, args.iterations, [int(size) for size in args.batch_sizes.split(",")]
+        ),
+        "chat_answer": bench_branches(logical, args.iterations),
+    }
+    if not args.skip_webhook:
+        report["webhook"] = bench_webhook(
+            args.requests,
+            args.concurrency,
+            args.events_per_request,
+            stub_faults={
+                "latency": args.stub_latency,
+                "error_rate": args.stub_error_rate,
+                "expire_rate": args.stub_expire_rate,
+                "seed": 0,
+            },
+        )
+    report["intent_cache"] = logical.intent_cache.stats()
+    report["rss_end"] = rss_mb()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
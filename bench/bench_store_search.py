@@ -0,0 +1,106 @@
+"""วัด recall และ latency ของการค้นหาร้าน (store_index.StoreSearch) แบบ exact และ IVF
+
+    python bench/bench_store_search.py --sizes 12,1000,10000,100000 --nprobe 1,4,8,16
+ใช้เวกเตอร์สมมติขนาดเท่า embedding ของโมเดล (384) ที่จับกลุ่มกัน ความยากปรับด้วย --spread และ --noise
+คำถามคือเวกเตอร์ของร้านที่เติม noise แล้ว recall@k เทียบกับผลของ exact search
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from bench_pipeline import git_commit, summarize
+from intent_index import IntentIndex
+from store_index import IvfIndex, StoreSearch
+
+
+def clustered_vectors(rng, size, dim, clusters, spread):
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size)]
+    vectors += spread * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def noisy_queries(rng, matrix, count, noise):
+    queries = matrix[rng.integers(0, len(matrix), count)].copy()
+    queries += noise * rng.standard_normal(queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def time_search(search, queries, k):
+    samples, results = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.extend(search.search(query, k))
+        samples.append(time.perf_counter() - started)
+    return summarize(samples), results
+
+
+def recall(found, expected):
+    hits = [
+        len({row for row, _ in got} & {row for row, _ in want}) / max(1, len(want))
+        for got, want in zip(found, expected)
+    ]
+    return round(float(np.mean(hits)), 4)
+
+
+def bench_size(rng, size, args):
+    matrix = clustered_vectors(rng, size, args.dim, max(1, size // 50), args.spread)
+    index = IntentIndex(matrix, [""] * size, [str(row) for row in range(size)])
+    queries = noisy_queries(rng, matrix, args.queries, args.noise)
+
+    exact = StoreSearch(index)
+    exact_latency, expected = time_search(exact, queries, args.k)
+    started = time.perf_counter()
+    exact.search(queries, args.k)
+    batch_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    ivf = IvfIndex.build(matrix)
+    build_seconds = time.perf_counter() - started
+    probes = {}
+    for nprobe in args.nprobe:
+        if nprobe > ivf.nlist:
+            continue
+        latency, found = time_search(StoreSearch(index, ivf, nprobe), queries, args.k)
+        probes[f"nprobe_{nprobe}"] = {
+            "recall_at_k": recall(found, expected),
+            "scanned_fraction": round(min(1.0, nprobe / ivf.nlist), 4),
+            "latency": latency,
+        }
+    return {
+        "stores": size,
+        "exact": {
+            "latency": exact_latency,
+            "batch_per_query_ms": round(batch_seconds * 1000 / len(queries), 4),
+        },
+        "ivf": {"nlist": ivf.nlist, "build_seconds": round(build_seconds, 3), **probes},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark การค้นหาร้านด้วย embedding")
+    parser.add_argument("--sizes", default="12,1000,10000,100000")
+    parser.add_argument("--nprobe", default="1,4,8,16,32")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--spread", type=float, default=1.0, help="ความกระจายของร้านรอบกลุ่ม")
+    parser.add_argument("--noise", type=float, default=0.3, help="noise ของคำถามเทียบกับร้าน")
+    parser.add_argument("--out", default=None, help="บันทึก JSON ลงไฟล์แทนการพิมพ์")
+    args = parser.parse_args()
+    args.nprobe = [int(value) for value in args.nprobe.split(",")]
+
+    rng = np.random.default_rng(0)
+    report = {
+        "commit": git_commit(),
+        "k": args.k,
+        "runs": [bench_size(rng, int(size), args) for size in args.sizes.split(",")],
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
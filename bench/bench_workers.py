@@ -0,0 +1,166 @@
+"""วัดหน่วยความจำต่อ worker และ throughput ของ gunicorn (gunicorn.conf.py) เมื่อเพิ่มจำนวน worker
+
+รันจากโฟลเดอร์หลักของโปรเจกต์:
+    python bench/bench_workers.py --workers 1,2,4 --out bench_workers.json
+แต่ละรอบเปิด gunicorn ใหม่ที่ชี้ไปยัง stub ของ Messaging API แล้วยิง webhook ที่เซ็นถูกต้อง
+หน่วยความจำอ่านจาก /proc/<pid>/smaps_rollup: Rss นับ page ที่แชร์กันซ้ำทุก process
+ส่วน Pss หาร page ที่แชร์ตามจำนวน process ที่ใช้ ผลรวม Pss จึงเป็นหน่วยความจำที่ใช้จริงทั้งหมด
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_pipeline import ROOT, SECRET, drive_webhook, git_commit, signed_payload, summarize_webhook
+from stub_line_api import start_stub  # bench_pipeline เพิ่ม tools/ ใน sys.path ไว้แล้ว
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, proc, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn หยุดทำงาน (exit {proc.returncode})")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/readyz")
+            response = conn.getresponse()
+            body = json.loads(response.read())
+            if response.status == 200:
+                return body["startup_timings"]
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("gunicorn ไม่พร้อมภายในเวลาที่กำหนด")
+
+
+def children(pid):
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # field ที่ 4 คือ ppid (ชื่อ process ในวงเล็บอาจมีช่องว่าง จึงตัดหลัง ")")
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def wait_workers(pid, count, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        pids = children(pid)
+        if len(pids) >= count:
+            return pids
+        time.sleep(0.2)
+    raise RuntimeError("worker ของ gunicorn เริ่มไม่ครบ")
+
+
+def memory_mb(pid):
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024.0
+    shared = fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {
+        "rss_mb": round(fields.get("Rss", 0), 1),
+        "pss_mb": round(fields.get("Pss", 0), 1),
+        "shared_mb": round(shared, 1),
+        "private_mb": round(private, 1),
+    }
+
+
+def bench_workers(count, args, stub_url):
+    port = free_port()
+    session_dir = tempfile.mkdtemp(prefix="bench-sessions-")
+    env = dict(
+        os.environ,
+        WEB_CONCURRENCY=str(count),
+        WEB_THREADS=str(args.threads),
+        PORT=str(port),
+        LINE_API_HOST=stub_url,
+        SESSION_DB=os.path.join(session_dir, "sessions.sqlite3"),
+    )
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        startup_timings = wait_ready(port, proc, args.ready_timeout)
+        ready_seconds = round(time.perf_counter() - started, 3)
+        worker_pids = wait_workers(proc.pid, count)
+        idle = {pid: memory_mb(pid) for pid in worker_pids}
+
+        payloads = [signed_payload(i, args.events_per_request) for i in range(args.requests)]
+        results, elapsed = drive_webhook(port, payloads, args.concurrency)
+        stats = summarize_webhook(results, elapsed)
+
+        loaded = [memory_mb(pid) for pid in worker_pids]
+        master = memory_mb(proc.pid)
+        stats.update(
+            {
+                "workers": count,
+                "ready_seconds": ready_seconds,
+                "startup_timings": startup_timings,
+                "master": master,
+                "worker_memory_idle": list(idle.values()),
+                "worker_memory_after_load": loaded,
+                "total_pss_mb": round(master["pss_mb"] + sum(m["pss_mb"] for m in loaded), 1),
+            }
+        )
+        return stats
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark gunicorn ตามจำนวน worker")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--threads", type=int, default=4, help="WEB_THREADS ต่อ worker")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--events-per-request", type=int, default=1)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--out", default=None, help="บันทึก JSON ลงไฟล์แทนการพิมพ์")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SECRET", SECRET)
+    stub = start_stub()
+    report = {"commit": git_commit(), "cpu_count": os.cpu_count(), "runs": []}
+    for count in [int(value) for value in args.workers.split(",")]:
+        report["runs"].append(bench_workers(count, args, stub.url))
+    report["replies_sent"] = len(stub.received())
+    stub.shutdown()
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
@@ -0,0 +1,123 @@
+import csv
+import hashlib
+import json
+
+from geo import StoreLocator, parse_coordinates
+
+LATE_NIGHT_COLUMN = "เปิดหลังเที่ยงคืน"
+PARKING_COLUMN = "มีที่จอดรถ"
+CONTACT_COLUMNS = ("ช่องทางติดต่อ", "เว็บไซต์")
+MAP_COLUMN = "พิกัด"
+# พิกัดที่ scraper แปลงจากลิงก์แผนที่ไว้แล้ว (ไม่แสดงในคำตอบ)
+LAT_COLUMN = "ละติจูด"
+LON_COLUMN = "ลองจิจูด"
+HIDDEN_COLUMNS = (LAT_COLUMN, LON_COLUMN)
+# คอลัมน์ที่ใช้กรองร้านเท่านั้น ไม่แสดงในคำตอบแนะนำร้าน
+HIDDEN_IN_RECOMMEND = ("อันดับ", PARKING_COLUMN, LATE_NIGHT_COLUMN)
+# คอลัมน์ที่นำมา embed สำหรับค้นหาร้านด้วยข้อความอิสระ (คอลัมน์คำอธิบายใช้ถ้ามีใน CSV)
+SEARCH_COLUMNS = ("ชื่อร้าน", "ที่อยู่", "เวลาทำการ", "รายละเอียด", "คำอธิบาย")
+MISSING_VALUE = "ไม่มี"
+
+
+def _render(fields, columns):
+    return "".join(f"{key} : {fields[key]}\n" for key in columns)
+
+
+class StoreRecord:
+    __slots__ = (
+        "position",
+        "fields",
+        "name",
+        "late_night",
+        "parking",
+        "lat",
+        "lon",
+        "search_text",
+        "map_line",
+        "detail_block",
+        "recommend_block",
+        "recommend_block_no_contact",
+    )
+
+    def __init__(self, position, fields, columns):
+        self.position = position
+        self.fields = fields
+        self.name = fields.get("ชื่อร้าน", "")
+        self.late_night = fields.get(LATE_NIGHT_COLUMN, "")
+        self.parking = fields.get(PARKING_COLUMN, "")
+        self.lat, self.lon = _coordinates(fields)
+        self.search_text = " | ".join(
+            fields[key]
+            for key in SEARCH_COLUMNS
+            if fields.get(key) and fields[key] != MISSING_VALUE
+        )
+        # ข้อความของแต่ละร้านสร้างไว้ครั้งเดียวตอนโหลด แล้วนำมาต่อกันตอนตอบ (ดู reply_pages.STYLES)
+        self.map_line = f"{MAP_COLUMN} : {fields.get(MAP_COLUMN, '')}\n"
+        columns = [key for key in columns if key not in HIDDEN_COLUMNS]
+        self.detail_block = _render(fields, columns) + "\n"
+        shown = [key for key in columns if key not in HIDDEN_IN_RECOMMEND]
+        self.recommend_block = _render(fields, shown)
+        self.recommend_block_no_contact = _render(
+            fields, [key for key in shown if key not in CONTACT_COLUMNS]
+        )
+
+
+def _coordinates(fields):
+    try:
+        return float(fields[LAT_COLUMN]), float(fields[LON_COLUMN])
+    except (KeyError, TypeError, ValueError):
+        pass
+    # ไม่มีคอลัมน์พิกัด ลองอ่านจากลิงก์แผนที่ (ลิงก์แบบย่อ เช่น goo.gl/maps ไม่มีพิกัดในตัว)
+    return parse_coordinates(fields.get(MAP_COLUMN)) or (None, None)
+
+
+class StoreCatalogue:
+    """ข้อมูลร้านทั้งหมดที่โหลดจาก CSV ครั้งเดียว พร้อม bitmask สำหรับกรองร้าน
+
+    bit ที่ i ของ mask หมายถึงร้านลำดับที่ i ใน records
+    """
+
+    def __init__(self, columns, rows):
+        self.columns = tuple(columns)
+        self.records = tuple(
+            StoreRecord(i, fields, self.columns) for i, fields in enumerate(rows)
+        )
+        self.all_mask = (1 << len(self.records)) - 1
+        self.late_night_masks = self._build_masks("late_night")
+        self.parking_masks = self._build_masks("parking")
+        self.locator = StoreLocator(self.records)
+        self.search_texts = [record.search_text for record in self.records]
+        self.names = [record.name for record in self.records]
+        # เปลี่ยนเมื่อข้อมูลร้านเปลี่ยน ใช้ตรวจว่าตำแหน่งร้านที่จำไว้ (เช่นใน session) ยังชี้ร้านเดิม
+        self.version = hashlib.sha256(
+            json.dumps([self.columns, rows], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_csv(cls, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rows = [dict(row) for row in reader]
+            return cls(reader.fieldnames or [], rows)
+
+    def _build_masks(self, attribute):
+        masks = {}
+        for record in self.records:
+            value = getattr(record, attribute)
+            masks[value] = masks.get(value, 0) | (1 << record.position)
+        return masks
+
+    def filter_mask(self, late_night=None, parking=None):
+        # None คือไม่กรองด้วยเงื่อนไขนั้น
+        mask = self.all_mask
+        if late_night is not None:
+            mask &= self.late_night_masks.get(late_night, 0)
+        if parking is not None:
+            mask &= self.parking_masks.get(parking, 0)
+        return mask
+
+    def select(self, mask):
+        return [record for record in self.records if mask >> record.position & 1]
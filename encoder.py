@@ -0,0 +1,201 @@
+import importlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# เลือก backend ด้วย ENCODER_BACKEND
+#   torch       SentenceTransformer fp32 แบบเดิม
+#   torch-int8  โมเดลเดิมที่ quantize ชั้น Linear เป็น int8 แบบ dynamic
+#   onnx        ONNX Runtime จากไฟล์ที่สร้างด้วย tools/export_onnx.py
+BACKENDS = ("torch", "torch-int8", "onnx")
+DEFAULT_BACKEND = "torch"
+ONNX_DIR = "data/onnx"
+
+# backend ที่โหลดก่อน fork แล้วให้ process ลูกใช้ต่อได้ (ONNX Runtime สร้าง thread pool ตอนโหลด
+# thread เหล่านั้นไม่ติดไปกับ process ลูก จึงต้องโหลดใหม่ในแต่ละ worker)
+FORK_SAFE_BACKENDS = ("torch", "torch-int8")
+
+
+def onnx_dir(model_name):
+    return os.path.join(ONNX_DIR, model_name.replace("/", "__"))
+
+
+def _import(module, timings, phase):
+    started = time.perf_counter()
+    value = importlib.import_module(module)
+    if timings is not None:
+        timings[phase] = round(time.perf_counter() - started, 3)
+    return value
+
+
+def _normalize(embeddings):
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.clip(norms, 1e-12, None)
+
+
+class SentenceTransformerEncoder:
+    """ห่อ SentenceTransformer ให้มีชื่อ backend ติดไปด้วย ใช้เป็น key ของ index"""
+
+    def __init__(self, model, model_name, backend):
+        self.model = model
+        self.backend = backend
+        self.name = f"{model_name}@{backend}"
+        self.dim = model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        return self.model.encode(
+            sentences,
+            batch_size=batch_size,
+            convert_to_numpy=convert_to_numpy,
+            normalize_embeddings=normalize_embeddings,
+        )
+
+
+class OnnxEncoder:
+    """รันโมเดลที่ export เป็น ONNX ด้วย ONNX Runtime แล้วทำ mean pooling เอง ไม่ต้องโหลด torch"""
+
+    def __init__(self, model_name, path=None, timings=None):
+        path = path or onnx_dir(model_name)
+        try:
+            ort = _import("onnxruntime", timings, "import_onnxruntime")
+            transformers = _import("transformers", timings, "import_transformers")
+        except ImportError as e:
+            raise RuntimeError(
+                "ENCODER_BACKEND=onnx ต้องติดตั้ง onnxruntime และ transformers ก่อน"
+            ) from e
+        with open(os.path.join(path, "encoder.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        options = ort.SessionOptions()
+        threads = int(os.getenv("ENCODER_THREADS", 0))
+        if threads:
+            options.intra_op_num_threads = threads
+        model_file = os.getenv("ONNX_MODEL_FILE", meta["model_file"])
+        self.session = ort.InferenceSession(
+            os.path.join(path, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.tokenizer = transformers.AutoTokenizer.from_pretrained(path)
+        self.max_seq_length = meta["max_seq_length"]
+        self.dim = meta["dim"]
+        self.backend = "onnx"
+        self.name = f"{model_name}@onnx:{model_file}"
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        batches = []
+        for start in range(0, len(sentences), batch_size):
+            tokens = self.tokenizer(
+                list(sentences[start : start + batch_size]),
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            mask = tokens["attention_mask"].astype(np.int64)
+            hidden = self.session.run(
+                None,
+                {"input_ids": tokens["input_ids"].astype(np.int64), "attention_mask": mask},
+            )[0]
+            # mean pooling เฉพาะ token จริง ตามที่ SentenceTransformer ทำ
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+            batches.append(pooled.astype(np.float32))
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, self.dim), np.float32)
+        if normalize_embeddings:
+            embeddings = _normalize(embeddings)
+        return embeddings[0] if single else embeddings
+
+
+def backend_name():
+    return os.getenv("ENCODER_BACKEND", DEFAULT_BACKEND)
+
+
+def set_num_threads(threads):
+    """จำนวน thread ที่ torch ใช้คำนวณใน process นี้ (ONNX Runtime ใช้ ENCODER_THREADS ตอนโหลดแทน)"""
+    torch = sys.modules.get("torch")
+    if torch is not None and threads > 0:
+        torch.set_num_threads(threads)
+
+
+def load_encoder(model_name, backend=None, timings=None):
+    backend = backend or backend_name()
+    if backend not in BACKENDS:
+        raise ValueError(f"ไม่รู้จัก ENCODER_BACKEND: {backend} (เลือกจาก {', '.join(BACKENDS)})")
+    if backend == "onnx":
+        return OnnxEncoder(model_name, timings=timings)
+
+    torch = _import("torch", timings, "import_torch")
+    set_num_threads(int(os.getenv("ENCODER_THREADS", 0)))
+    sentence_transformers = _import(
+        "sentence_transformers", timings, "import_sentence_transformers"
+    )
+    # บังคับใช้ CPU แทน MPS เพื่อหลีกเลี่ยง tensor conversion error
+    device = "cuda" if torch.cuda.is_available() and backend == "torch" else "cpu"
+    model = sentence_transformers.SentenceTransformer(model_name, device=device)
+    if backend == "torch-int8":
+        # dynamic quantization รองรับเฉพาะ CPU
+        model = torch.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+    return SentenceTransformerEncoder(model, model_name, backend)
+
+
+def export_onnx(model_name, out_dir=None, quantize=True, opset=14):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = out_dir or onnx_dir(model_name)
+    os.makedirs(out_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device="cpu")
+    transformer = model[0].auto_model.eval()
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, input_ids, attention_mask):
+            return self.transformer(input_ids=input_ids, attention_mask=attention_mask)[0]
+
+    dummy = model.tokenizer(["สวัสดี", "ร้านเหล้าใกล้จตุจักร"], padding=True, return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    torch.onnx.export(
+        _HiddenStates(transformer),
+        (dummy["input_ids"], dummy["attention_mask"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "last_hidden_state": {0: "batch", 1: "sequence"},
+        },
+        opset_version=opset,
+    )
+    model.tokenizer.save_pretrained(out_dir)
+
+    model_file = "model.onnx"
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            fp32_path, os.path.join(out_dir, "model.int8.onnx"), weight_type=QuantType.QInt8
+        )
+        model_file = "model.int8.onnx"
+
+    meta = {
+        "model": model_name,
+        "model_file": model_file,
+        "max_seq_length": model.max_seq_length,
+        "dim": model.get_sentence_embedding_dimension(),
+        "pooling": "mean",
+    }
+    with open(os.path.join(out_dir, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1)
+    return out_dir
@@ -0,0 +1,200 @@
+import heapq
+import json
+import math
+import re
+
+import numpy as np
+
+from intent_cache import normalize_utterance
+
+EARTH_RADIUS_KM = 6371.0088
+LANDMARKS_PATH = "data/landmarks.json"
+
+# รูปแบบพิกัดที่เจอในลิงก์ Google Maps เรียงตามความแม่นยำ
+#   !3d<lat>!4d<lon>   ตำแหน่งหมุดของสถานที่
+#   @<lat>,<lon>       จุดกึ่งกลางของแผนที่
+#   q=<lat>,<lon>      ลิงก์ค้นหา/ปักหมุด (ll, query, center, destination เช่นกัน)
+_COORDINATE_PATTERNS = (
+    re.compile(r"!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)"),
+    re.compile(r"@(-?\d+\.\d+),(-?\d+\.\d+)"),
+    re.compile(
+        r"[?&](?:q|ll|query|center|destination)=(-?\d+\.\d+)(?:,|%2C)\s*(-?\d+\.\d+)",
+        re.IGNORECASE,
+    ),
+    re.compile(r"^\s*(-?\d{1,2}\.\d+)\s*,\s*(-?\d{1,3}\.\d+)\s*$"),
+)
+
+
+def parse_coordinates(text):
+    """คืนค่า (lat, lon) จากลิงก์แผนที่หรือข้อความ "lat, lon" หรือ None ถ้าไม่มีพิกัด"""
+    for pattern in _COORDINATE_PATTERNS:
+        match = pattern.search(text or "")
+        if match:
+            lat, lon = float(match.group(1)), float(match.group(2))
+            if -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0:
+                return lat, lon
+    return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def unit_vectors(lats, lons):
+    # จุดบนทรงกลมหนึ่งหน่วย ระยะตรง (chord) เรียงลำดับเหมือนระยะบนผิวโลก และไม่มีปัญหาที่เส้น 180 องศา
+    lats = np.radians(np.asarray(lats, dtype=np.float64))
+    lons = np.radians(np.asarray(lons, dtype=np.float64))
+    return np.stack(
+        [np.cos(lats) * np.cos(lons), np.cos(lats) * np.sin(lons), np.sin(lats)], axis=-1
+    )
+
+
+class KDTree:
+    """k-d tree ของจุด 3 มิติ แต่ละ leaf เก็บจุดไม่เกิน leaf_size จุดเรียงติดกันใน points"""
+
+    def __init__(self, points, leaf_size=16):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        order = np.arange(len(points))
+        # แต่ละโหนดคือ (แกน, ค่าที่แบ่ง, ลูกซ้าย, ลูกขวา, start, end) แกน -1 คือ leaf
+        self._nodes = []
+        if len(points):
+            self._build(points, order, 0, len(points))
+        self.order = order
+        self.points = points[order]
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, points, order, start, end):
+        node = len(self._nodes)
+        self._nodes.append(None)
+        if end - start <= self.leaf_size:
+            self._nodes[node] = (-1, 0.0, -1, -1, start, end)
+            return node
+        subset = points[order[start:end]]
+        # แบ่งตามแกนที่จุดกระจายกว้างที่สุด ที่ค่ากลาง
+        axis = int(np.argmax(subset.max(axis=0) - subset.min(axis=0)))
+        mid = (end - start) // 2
+        order[start:end] = order[start:end][np.argpartition(subset[:, axis], mid)]
+        split = float(points[order[start + mid], axis])
+        left = self._build(points, order, start, start + mid)
+        right = self._build(points, order, start + mid, end)
+        self._nodes[node] = (axis, split, left, right, start, end)
+        return node
+
+    def query(self, point, k=1):
+        """คืนค่า list ของ (ลำดับเดิมของจุด, ระยะตรงยกกำลังสอง) เรียงจากใกล้ไปไกล"""
+        if not self._nodes or k <= 0:
+            return []
+        point = np.asarray(point, dtype=np.float64)
+        best = []  # max-heap ของ (-ระยะ, ตำแหน่ง)
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            axis, split, left, right, start, end = self._nodes[node]
+            if axis < 0:
+                distances = ((self.points[start:end] - point) ** 2).sum(axis=1)
+                for offset, distance in enumerate(distances.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, start + offset))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, start + offset))
+                continue
+            diff = float(point[axis]) - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            # ใส่ฝั่งไกลก่อนเพื่อให้ออกจาก stack ทีหลัง ตอนนั้นจะตัดทิ้งได้ถ้าไกลกว่าที่เจอแล้ว
+            stack.append((far, diff * diff))
+            stack.append((near, bound))
+        return [(int(self.order[pos]), -distance) for distance, pos in sorted(best, reverse=True)]
+
+
+class StoreLocator:
+    """ค้นหาร้านที่ใกล้ตำแหน่งที่สุดจากร้านที่มีพิกัด"""
+
+    def __init__(self, records):
+        self.records = [record for record in records if record.lat is not None]
+        self.tree = KDTree(
+            unit_vectors(
+                [record.lat for record in self.records], [record.lon for record in self.records]
+            )
+        )
+
+    def __len__(self):
+        return len(self.records)
+
+    def nearest(self, lat, lon, k=3):
+        """คืนค่า list ของ (record, ระยะทางเป็นกิโลเมตร) เรียงจากใกล้ไปไกล"""
+        hits = self.tree.query(unit_vectors(lat, lon), k)
+        return [
+            (
+                self.records[row],
+                haversine_km(lat, lon, self.records[row].lat, self.records[row].lon),
+            )
+            for row, _ in hits
+        ]
+
+
+class Landmark:
+    __slots__ = ("name", "aliases", "lat", "lon")
+
+    def __init__(self, name, aliases, lat, lon):
+        self.name = name
+        self.aliases = aliases
+        self.lat = lat
+        self.lon = lon
+
+
+class Gazetteer:
+    """ชื่อสถานที่สำคัญพร้อมพิกัด ใช้ตอบคำถามแบบ "ร้านใกล้ X" """
+
+    NEAR_WORDS = ("ใกล้", "แถว", "near", "around")
+
+    def __init__(self, landmarks):
+        self.landmarks = list(landmarks)
+        # เทียบแบบไม่มีช่องว่าง ชื่อยาวก่อนเพื่อให้ "bts หมอชิต" ชนะ "หมอชิต"
+        self._aliases = sorted(
+            (
+                (_compact(alias), landmark)
+                for landmark in self.landmarks
+                for alias in (landmark.name, *landmark.aliases)
+            ),
+            key=lambda item: len(item[0]),
+            reverse=True,
+        )
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    @classmethod
+    def load(cls, path=LANDMARKS_PATH):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls([])
+        return cls(
+            Landmark(item["name"], tuple(item.get("aliases", ())), item["lat"], item["lon"])
+            for item in data["landmarks"]
+        )
+
+    def find(self, text):
+        """คืนค่า Landmark ถ้าข้อความถามหาร้านใกล้สถานที่ที่รู้จัก"""
+        text = _compact(text)
+        if not any(word in text for word in self.NEAR_WORDS):
+            return None
+        for alias, landmark in self._aliases:
+            if alias in text:
+                return landmark
+        return None
+
+
+def _compact(text):
+    return normalize_utterance(text).replace(" ", "")
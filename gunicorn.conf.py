@@ -0,0 +1,67 @@
+"""รันหลาย process: gunicorn -c gunicorn.conf.py main:app
+
+process แม่โหลด model, ข้อมูลร้าน และ intent index ครั้งเดียวก่อน fork
+worker ทุกตัวใช้หน่วยความจำชุดนั้นร่วมกันแบบ copy-on-write มีแค่ไฟล์ .npy ของ index ที่เปิดแบบ mmap
+(ข้อมูลร้านเป็น object ปกติ page ที่ worker แก้ เช่น reference count จะถูกคัดลอกเป็นของ worker นั้น)
+
+WEB_CONCURRENCY  จำนวน worker (ค่าเริ่มต้น 2)
+WEB_THREADS      thread ต่อ worker (ค่าเริ่มต้น 4)
+ENCODER_THREADS  thread ของ torch ต่อ worker (ค่าเริ่มต้น จำนวน core หารด้วยจำนวน worker)
+"""
+import gc
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread"
+bind = f"0.0.0.0:{os.getenv('PORT', 10000)}"
+preload_app = True
+timeout = 60
+
+if workers > 1:
+    # session และข้อมูลที่ reload ต้องเห็นตรงกันทุก worker
+    # (SQLite เปิด connection ตอนใช้ครั้งแรกในแต่ละ worker ไม่ใช่ใน process แม่)
+    # (POST /admin/reload จะ reload แค่ worker ที่รับ request นั้น)
+    os.environ.setdefault("SESSION_BACKEND", "sqlite")
+    os.environ.setdefault("RELOAD_INTERVAL", "5")
+
+_worker_threads = int(os.getenv("ENCODER_THREADS", 0)) or max(1, (os.cpu_count() or 1) // workers)
+
+
+def when_ready(server):
+    # main ถูก import แล้วเพราะ preload_app ตรงนี้ยังเป็น process แม่ก่อน fork worker ตัวแรก
+    import encoder
+    import logical
+
+    if encoder.backend_name() in encoder.FORK_SAFE_BACKENDS:
+        # ให้ torch คำนวณด้วย thread เดียวใน process แม่ OpenMP ที่เริ่ม thread pool แล้วจะค้างหลัง fork
+        os.environ["ENCODER_THREADS"] = "1"
+        logical.warm_up()
+        os.environ["ENCODER_THREADS"] = str(_worker_threads)
+    else:
+        # ONNX Runtime โหลดใหม่ในแต่ละ worker ได้แค่ข้อมูลร้านที่แชร์กัน
+        logical.get_state()
+    server.log.info("startup timings %s", logical.startup_timings)
+    # ย้าย object ที่โหลดแล้วออกจากการตรวจของ GC เพื่อไม่ให้ GC เขียนทับ page ที่แชร์กับ worker
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import encoder
+    import logical
+    import main
+
+    os.environ["ENCODER_THREADS"] = str(_worker_threads)
+    encoder.set_num_threads(_worker_threads)
+    if encoder.backend_name() not in encoder.FORK_SAFE_BACKENDS and main.WARMUP != "lazy":
+        # โหลดโมเดลของ worker นี้ใน background ทันที /readyz จะได้ตอบ 200 โดยไม่ต้องรอข้อความแรก
+        # (eager ก็โหลดใน background เพราะถ้าค้างใน post_fork นานเกิน timeout gunicorn จะ kill worker)
+        logical.start_warm_up()
+    main.start_background()
+
+
+def worker_exit(server, worker):
+    import main
+
+    main.stop_background()
@@ -0,0 +1,94 @@
+import re
+import string
+import threading
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_MAX_SIZE = 4096
+
+_ZERO_WIDTH = re.compile("[\u200b\u200c\u200d\u2060\ufeff\u00ad]")
+_WHITESPACE = re.compile(r"\s+")
+# ตัวอักษรเดียวกันซ้ำตั้งแต่ 3 ตัวขึ้นไป เช่น "หืมมม" หรือ "!!!" ย่อให้เหลือตัวเดียว
+_REPEATED = re.compile(r"(.)\1{2,}")
+# เครื่องหมายท้ายวลีไม่ทำให้ความหมายเปลี่ยน "หืมมม..." ใน corpus จึงตรงกับ "หืมมม" ที่ผู้ใช้พิมพ์
+_TRAILING_PUNCTUATION = string.punctuation + "…"
+
+
+def normalize_utterance(text):
+    text = unicodedata.normalize("NFC", text)
+    text = _ZERO_WIDTH.sub("", text)
+    text = _WHITESPACE.sub(" ", text).strip()
+    text = _REPEATED.sub(r"\1", text)
+    return text.lower()
+
+
+def _exact_key(key):
+    return key.rstrip(_TRAILING_PUNCTUATION) or key
+
+
+class IntentCache:
+    """LRU cache ของผล intent (วลีที่ตรงและคะแนน) ตามข้อความที่ normalize แล้ว
+
+    ไม่ได้เก็บคำตอบสุดท้าย เพราะคำตอบขึ้นกับสถานะบทสนทนาของแต่ละคน
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.exact_hits = 0
+        self.evictions = 0
+        # เพิ่มขึ้นทุกครั้งที่เปลี่ยน corpus ผลที่คำนวณจาก corpus เก่าจะไม่ถูกเก็บ
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._exact = {}
+        self._lock = threading.Lock()
+
+    def set_corpus(self, phrases):
+        # วลีที่ตรงกับ corpus เป๊ะๆ (หลัง normalize) ไม่ต้องผ่านโมเดลเลย
+        exact = {}
+        for phrase in phrases:
+            exact.setdefault(_exact_key(normalize_utterance(phrase)), phrase)
+        with self._lock:
+            self._exact = exact
+            self._entries.clear()
+            self.generation += 1
+
+    def get(self, key):
+        with self._lock:
+            phrase = self._exact.get(_exact_key(key))
+            if phrase is not None:
+                self.exact_hits += 1
+                return [phrase, 1.0]
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key, result, generation=None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
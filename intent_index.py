@@ -0,0 +1,137 @@
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# ไฟล์ index เก็บไว้ข้างๆ data/hangout_info.csv
+INDEX_DIR = "data"
+INDEX_NAME = "intent_index"
+
+
+def corpus_hash(model_name, phrases, labels):
+    payload = json.dumps(
+        {"model": model_name, "phrases": list(phrases), "labels": list(labels)},
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class IntentIndex:
+    """เมทริกซ์ embedding ที่ normalize แล้ว (หนึ่งแถวต่อหนึ่งวลี) พร้อม label ของแต่ละแถว"""
+
+    def __init__(self, matrix, phrases, labels, key=""):
+        self.matrix = matrix
+        self.phrases = list(phrases)
+        self.labels = np.asarray(labels)
+        self.key = key
+
+    def __len__(self):
+        return len(self.phrases)
+
+    def scores(self, question_vec):
+        # เวกเตอร์ทั้งหมด normalize แล้ว dot product จึงเท่ากับ cosine similarity
+        return self.matrix @ question_vec
+
+    def best(self, question_vec):
+        scores = self.scores(question_vec)
+        row = int(np.argmax(scores))
+        return row, float(scores[row])
+
+
+def encode_phrases(model, phrases):
+    matrix = model.encode(
+        list(phrases), convert_to_numpy=True, normalize_embeddings=True
+    )
+    return np.ascontiguousarray(matrix, dtype=np.float32)
+
+
+def _paths(index_dir, name):
+    base = os.path.join(index_dir, name)
+    return base + ".npy", base + ".json"
+
+
+def _atomic_write(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    # os.replace ไม่ทับ inode เดิม process ที่ mmap ไฟล์เก่าไว้จึงอ่านต่อได้
+    os.replace(tmp_path, path)
+
+
+def save_index(index, model_name, index_dir=INDEX_DIR, name=INDEX_NAME):
+    matrix_path, meta_path = _paths(index_dir, name)
+    meta = {
+        "model": model_name,
+        "key": index.key,
+        "rows": len(index),
+        "dim": int(index.matrix.shape[1]) if len(index) else 0,
+        "phrases": index.phrases,
+        "labels": index.labels.tolist(),
+    }
+    _atomic_write(matrix_path, lambda f: np.save(f, index.matrix))
+    _atomic_write(
+        meta_path,
+        lambda f: f.write(json.dumps(meta, ensure_ascii=False, indent=1).encode("utf-8")),
+    )
+
+
+def load_index(model_name, phrases, labels, index_dir=INDEX_DIR, name=INDEX_NAME):
+    matrix_path, meta_path = _paths(index_dir, name)
+    key = corpus_hash(model_name, phrases, labels)
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("key") != key:
+            return None
+        matrix = np.load(matrix_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if matrix.shape[0] != len(phrases):
+        return None
+    return IntentIndex(matrix, phrases, labels, key=key)
+
+
+def update_index(previous, model, model_name, phrases, labels, index_dir=INDEX_DIR, name=INDEX_NAME):
+    """สร้าง index ใหม่โดย encode เฉพาะวลีที่ยังไม่มีใน index เดิม คืนค่า (index, จำนวนแถวที่ encode ใหม่)"""
+    key = corpus_hash(model_name, phrases, labels)
+    if previous is not None and previous.key == key:
+        return previous, 0
+    # worker อื่นอาจสร้างไฟล์ index ของ corpus นี้ไว้แล้ว
+    index = load_index(model_name, phrases, labels, index_dir=index_dir, name=name)
+    if index is not None:
+        return index, 0
+
+    dim = model.dim
+    known = {}
+    # index เดิมที่ว่าง (เช่นตอนยังไม่มีร้าน) หรือมีขนาดเวกเตอร์ไม่ตรงกับโมเดล ไม่มีแถวให้ใช้ต่อ
+    if previous is not None and len(previous) and previous.matrix.shape[1] == dim:
+        known = {phrase: row for row, phrase in enumerate(previous.phrases)}
+    missing = [phrase for phrase in dict.fromkeys(phrases) if phrase not in known]
+    encoded = encode_phrases(model, missing) if missing else np.zeros((0, dim), np.float32)
+    missing_rows = {phrase: row for row, phrase in enumerate(missing)}
+    matrix = np.empty((len(phrases), dim), dtype=np.float32)
+    for row, phrase in enumerate(phrases):
+        if phrase in known:
+            matrix[row] = previous.matrix[known[phrase]]
+        else:
+            matrix[row] = encoded[missing_rows[phrase]]
+    index = IntentIndex(np.ascontiguousarray(matrix), phrases, labels, key=key)
+    try:
+        save_index(index, model_name, index_dir=index_dir, name=name)
+    except OSError as e:
+        log.warning("⚠️  บันทึก intent index ไม่สำเร็จ", extra={"error": repr(e)})
+        return index, len(missing)
+    # เปิดจากไฟล์แบบ mmap แทนสำเนาในหน่วยความจำ ทุก worker จะใช้ page cache ชุดเดียวกัน
+    mapped = load_index(model_name, phrases, labels, index_dir=index_dir, name=name)
+    return (mapped if mapped is not None else index), len(missing)
+
+
+def load_or_build(model, model_name, phrases, labels, index_dir=INDEX_DIR, name=INDEX_NAME):
+    index, _ = update_index(
+        None, model, model_name, phrases, labels, index_dir=index_dir, name=name
+    )
+    return index
@@ -0,0 +1,111 @@
+import math
+from collections import Counter, defaultdict
+
+from intent_cache import normalize_utterance
+
+# คำลงท้ายที่ตัดออกก่อนเทียบ ตัดซ้ำได้หลายคำ เช่น "แนะนำร้านหน่อยครับ" เหลือ "แนะนำร้าน"
+PARTICLES = tuple(
+    sorted("ครับผม ครับ คับ ค้าบ ค่ะ คะ ค่า ค้า จ้า จ้ะ จ๊ะ งับ นะ น้า หน่อย ฮะ".split(), key=len, reverse=True)
+)
+# คำปฏิเสธ ข้อความที่มีคำเหล่านี้ต่างจากวลีที่ตรง (เช่น "ไม่ต้องการยกเลิก" กับ "ต้องการยกเลิก") ให้โมเดลตัดสิน
+NEGATORS = ("ไม่", "ม่าย", "อย่า")
+NGRAM_SIZES = (2, 3)
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MARGIN = 0.15
+
+
+def strip_particles(text):
+    text = normalize_utterance(text).replace(" ", "")
+    stripped = True
+    while stripped:
+        stripped = False
+        for particle in PARTICLES:
+            if text.endswith(particle) and len(text) > len(particle):
+                text = text[: -len(particle)]
+                stripped = True
+                break
+    return text
+
+
+def negated(key):
+    return any(negator in key for negator in NEGATORS)
+
+
+def _grams(key):
+    # เติมขอบคำเพื่อให้คำสั้นๆ เช่น "ดี" หรือ "ใช่" มี n-gram มากพอ และต้นคำ/ท้ายคำมีน้ำหนัก
+    padded = f"^{key}$"
+    return [padded[i : i + n] for n in NGRAM_SIZES for i in range(len(padded) - n + 1)]
+
+
+class LexicalMatcher:
+    """ขั้นแรกของการจัด intent: TF-IDF cosine ของ character n-gram ไม่ต้องตัดคำภาษาไทย
+
+    ตอบเองเฉพาะเมื่อมั่นใจ คือคะแนนสูงสุดถึง threshold และสูงกว่า intent อื่นอย่างน้อย margin
+    และข้อความกับวลีที่ตรงมีคำปฏิเสธเหมือนกัน (n-gram แทบไม่เปลี่ยนเมื่อเติม "ไม่" ข้างหน้า) ที่เหลือส่งต่อให้โมเดล
+    """
+
+    def __init__(self, phrases, labels, threshold=DEFAULT_THRESHOLD, margin=DEFAULT_MARGIN):
+        self.phrases = list(phrases)
+        self.labels = list(labels)
+        self.threshold = threshold
+        self.margin = margin
+        keys = [strip_particles(phrase) for phrase in self.phrases]
+        self._negated = [negated(key) for key in keys]
+        self._exact = {}
+        for row, key in enumerate(keys):
+            self._exact.setdefault(key, []).append(row)
+        counts = [Counter(_grams(key)) for key in keys]
+        documents = Counter(gram for count in counts for gram in count)
+        self._idf = {
+            gram: math.log((1 + len(keys)) / (1 + df)) + 1.0 for gram, df in documents.items()
+        }
+        # n-gram ที่ไม่มีใน corpus ได้น้ำหนักสูงสุด ข้อความที่มีส่วนแปลกปลอมมากคะแนนจึงลดลง
+        self._unknown_idf = math.log(1 + len(keys)) + 1.0
+        self._postings = defaultdict(list)
+        for row, count in enumerate(counts):
+            for gram, weight in self._vector(count).items():
+                self._postings[gram].append((row, weight))
+
+    def _vector(self, count):
+        vector = {
+            gram: (1.0 + math.log(tf)) * self._idf.get(gram, self._unknown_idf)
+            for gram, tf in count.items()
+        }
+        norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+        return {gram: weight / norm for gram, weight in vector.items()}
+
+    def scores(self, text):
+        """คะแนนสูงสุดของแต่ละ intent เรียงจากมากไปน้อย list ของ (label, แถว, คะแนน)"""
+        key = strip_particles(text)
+        if not key:
+            return []
+        rows = self._exact.get(key)
+        if rows:
+            # วลีเดียวกันหลังตัดคำลงท้ายได้ 1.0 ถ้าอยู่หลาย intent ให้ margin ตัดสิน
+            best = {}
+            for row in rows:
+                best.setdefault(self.labels[row], (self.labels[row], row, 1.0))
+            return list(best.values())
+        totals = defaultdict(float)
+        for gram, weight in self._vector(Counter(_grams(key))).items():
+            for row, phrase_weight in self._postings.get(gram, ()):
+                totals[row] += weight * phrase_weight
+        best = {}
+        for row, score in totals.items():
+            label = self.labels[row]
+            if label not in best or score > best[label][2]:
+                best[label] = (label, row, score)
+        return sorted(best.values(), key=lambda item: item[2], reverse=True)
+
+    def match(self, text):
+        """คืนค่า (แถวของวลีที่ตรง, คะแนน) ถ้ามั่นใจ หรือ None ถ้าต้องให้โมเดลตัดสิน"""
+        ranked = self.scores(text)
+        if not ranked:
+            return None
+        _, row, score = ranked[0]
+        runner_up = ranked[1][2] if len(ranked) > 1 else 0.0
+        if negated(strip_particles(text)) != self._negated[row]:
+            return None
+        if score >= self.threshold and score - runner_up >= self.margin:
+            return row, score
+        return None
@@ -0,0 +1,62 @@
+import json
+
+INTENTS_PATH = "data/intents.json"
+
+# ลำดับของกลุ่มวลีใน combined corpus (แถวของ intent index เรียงตามนี้)
+COMBINED_ORDER = (
+    "cancel",
+    "thank",
+    "greeting",
+    "hangout",
+    "ranking",
+    "location",
+    "recommend",
+    "thinking",
+    "detail",
+    "stores",
+)
+
+
+class IntentSet:
+    """วลีของแต่ละ intent ที่โหลดจาก data/intents.json"""
+
+    def __init__(self, groups):
+        self.greeting = tuple(groups.get("greeting", ()))
+        self.hangout = tuple(groups.get("hangout", ()))
+        self.ranking = tuple(groups.get("ranking", ()))
+        self.location = tuple(groups.get("location", ()))
+        self.recommend = tuple(groups.get("recommend", ()))
+        self.detail = tuple(groups.get("detail", ()))
+        self.stores = tuple(groups.get("stores", ()))
+        self.agree = tuple(groups.get("agree", ()))
+        self.disagree = tuple(groups.get("disagree", ()))
+        self.cancel = tuple(groups.get("cancel", ()))
+        self.thank = tuple(groups.get("thank", ()))
+        self.asking_hangout = tuple(groups.get("asking_hangout", ()))
+        self.thinking = self.agree + self.disagree
+        # ข้อความที่ตรงกับกลุ่มนี้เป๊ะๆ จะตอบเรื่องร้านโดยไม่ดูผลจากโมเดล
+        self.asking = self.asking_hangout + self.detail + self.stores
+        # วลีที่มีคำตอบของตัวเองเมื่อโมเดลจับคู่ได้ (กลุ่ม ranking/location ยังไม่มี)
+        self.answered = frozenset(
+            self.greeting + self.cancel + self.thank + self.hangout + self.recommend + self.thinking
+        )
+        self.combined = [
+            phrase for label in COMBINED_ORDER for phrase in getattr(self, label)
+        ]
+        self.labels = [
+            label for label in COMBINED_ORDER for _ in getattr(self, label)
+        ]
+        # เหมือน labels แต่แยก thinking เป็น agree/disagree เพราะคำตอบต่างกัน
+        self.fine_labels = [
+            label if label != "thinking" else "agree" if row < len(self.agree) else "disagree"
+            for label, row in zip(self.labels, self._rows_in_group())
+        ]
+
+    def _rows_in_group(self):
+        # ลำดับของวลีภายในกลุ่มของตัวเอง เรียงแบบเดียวกับ combined
+        return [row for label in COMBINED_ORDER for row in range(len(getattr(self, label)))]
+
+    @classmethod
+    def load(cls, path=INTENTS_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
@@ -0,0 +1,101 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+# field มาตรฐานของ LogRecord ที่ไม่ต้องใส่ซ้ำใน JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        exc = getattr(record, "exc", None)
+        return f"{text}\n{exc}" if exc else text
+
+
+class DroppingQueueHandler(QueueHandler):
+    """ส่ง log เข้าคิวโดยไม่รอ ถ้าคิวเต็มจะทิ้ง log นั้นแทนการบล็อก request"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # แปลงข้อความให้เสร็จก่อนเข้าคิว แต่แยก traceback ไว้เป็น field "exc"
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+            record.exc_text = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            DroppingQueueHandler.dropped += 1
+
+
+_listener = None
+_queue_handler = None
+
+
+def setup_logging(level=None, fmt=None, max_queue=10000):
+    # เขียน stdout จาก thread ของ QueueListener ไม่ใช่จาก thread ที่ตอบ request
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    level = level or os.getenv("LOG_LEVEL", "INFO")
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(TextFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    log_queue = queue.Queue(maxsize=max_queue)
+    root = logging.getLogger()
+    queue_handler = DroppingQueueHandler(log_queue)
+    # ตั้งระดับที่ handler ด้วย เพราะ logger อื่น (เช่น werkzeug) อาจตั้งระดับของตัวเองไว้ต่ำกว่า
+    queue_handler.setLevel(level)
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    _queue_handler = queue_handler
+    _listener = QueueListener(log_queue, stream)
+    _listener.start()
+    atexit.register(_stop_listener)
+    # thread ของ listener ไม่ติดไปกับ process ลูกหลัง fork (เช่น worker ของ gunicorn)
+    os.register_at_fork(after_in_child=_restart_listener)
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def _restart_listener():
+    global _listener
+    log_queue = queue.Queue(maxsize=_queue_handler.queue.maxsize)
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers)
+    _listener.start()
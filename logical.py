@@ -1,141 +1,328 @@
-import pandas as pd
+import logging
+import threading
+import time
+import os
 import numpy as np
-from sentence_transformers import SentenceTransformer, util
-import torch
-
-# บังคับใช้ CPU แทน MPS เพื่อหลีกเลี่ยง tensor conversion error
-device = "cpu"
-if torch.cuda.is_available():
-    device = "cuda"
-
-model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2", device=device)
-
-# Load data
-df = pd.read_csv("data/hangout_info.csv")
-
-# Corpus definitions
-question_greeting_corpus = [
-    "สวัสดี",
-    "สวัสดีงับ",
-    "ว่าไง",
-    "หืมมม...",
-    "ดี",
-    "ดีจ้า",
-    "ไง",
-    "โย่ว",
-]
-question_hangout_corpus = [
-    "ร้านเหล้า",
-    "แฮงค์เอาท์",
-    "ร้านนั่งชิล",
-    "ร้านดื่ม",
-    "ร้านกลางคืน",
-    "ร้านเหล้ากลางคืน",
-    "ร้านเหล้าที่ไหนดี",
-    "ที่ไหน",
-]
-question_ranking_corpus = ["จัดอันดับ", "ร้านที่ดีที่สุด", "ร้านน่าไป", "อันดับ", "จัดอันดับ"]
-question_location_corpus = [
-    "อยู่ที่ไหน",
-    "ไปยังไง",
-    "สถานที่ของร้าน",
-    "สถานที่",
-    "ขอโลเคชั่น",
-    "ปักหมุด",
-]
-question_recommend_corpus = [
-    "ช่วยแนะนำ",
-    "แนะนำ",
-    "ช่วยเหลือ",
-    "ต้องการรู้",
-    "ต้องการหาร้าน",
-    "แนะนำร้าน",
-    "ช่วยพาไป",
-    "ช่วยเลือก",
-    "แนะนำร้านเหล้า",
-    "แนะนำร้าน",
-    "ต้องการรู้จักร้าน",
-    "ร้านที่ต้องการ",
-    "นำเสนอ",
-    "เสนอร้านเหล้า",
-]
-question_detail_corpus = [
-    "รายละเอียด",
-    "ละเอียด",
-    "เนื้อหา",
-    "รายละเอียดร้าน",
-    "ละเอียดร้าน",
-    "เนื้อหาร้าน",
-]
-question_stores_corpus = [
-    "ร้านทั้งหมด",
-    "ทุกร้าน",
-    "เฉพาะชื่อร้าน",
-    "ชื่อร้านเท่านั้น",
-    "รายชื่อร้าน",
-    "อันดับร้าน",
-    "รายชื่อร้านเหล้า",
-    "อันดับร้านเหล้า",
-]
-agree_term = ["ใช่", "ต้องการ", "ช่าย", "ต้อง"]
-disagree_term = ["ไม่ใช่", "ไม่ต้องการ", "ม่าย", "ไม่"]
-cancle_corpus = ["ยกเลิก", "ต้องการยกเลิก"]
-question_thinking_corpus = agree_term + disagree_term
-asking_thank_corpus = [
-    "ขอบคุณ",
-    "ขอบคุณจ้า",
-    "ขอบคุณครับ",
-    "ขอบคุณค้าบ",
-    "ขอบคุณค้า",
-    "ขอบคุณค่ะ",
-    "แต้งจ้า",
-    "แต้ง",
-    "ขอบจ้า",
-    "บายๆ",
-    "เจอกันใหม่",
-]
-asking_hangout_corpus = [
-    "ร้านแฮงค์เอาท์ใกล้จตุจักร",
-    "ร้านเหล้าใกล้จตุจักร",
-    "ร้านจตุจักร",
-    "ใกล้จตุจักร",
-    "ร้านจตุจกร",
-    "ใกล้จตุจกร",
-    "ร้านเหล้าจตุจักร",
-]
-asking_corpus = asking_hangout_corpus + question_detail_corpus + question_stores_corpus
-combined_question_corpus = (
-    cancle_corpus
-    + asking_thank_corpus
-    + question_greeting_corpus
-    + question_hangout_corpus
-    + question_ranking_corpus
-    + question_location_corpus
-    + question_recommend_corpus
-    + question_thinking_corpus
-    + question_detail_corpus
-    + question_stores_corpus
-)
-
-user_input = []
+import encoder
+from catalogue import StoreCatalogue
+from geo import LANDMARKS_PATH, Gazetteer
+import intent_index
+from intents import INTENTS_PATH, IntentSet
+import reply_pages
+import session_store
+import store_index
+from intent_cache import IntentCache, normalize_utterance
+from intent_lexical import LexicalMatcher
+from metrics import FALLBACK_TOTAL, INTENT_TIER_TOTAL, INTENT_TOTAL, PAGE_BYTES, STAGE_SECONDS
+from reply_pages import Listing
 
+log = logging.getLogger(__name__)
 
-def calculate_similarity_score(question, corpus):
-    question_vec = model.encode(
-        question, convert_to_tensor=True, normalize_embeddings=True
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+DATA_PATH = "data/hangout_info.csv"
+# คะแนน cosine ขั้นต่ำที่ถือว่าข้อความตรงกับวลีของ intent
+INTENT_THRESHOLD = 0.6
+# ขั้นแรกของการจัด intent เทียบ n-gram ของตัวอักษรก่อน ตอบเองเมื่อมั่นใจ ที่เหลือส่งให้โมเดล
+# LEXICAL_TIER=0 ปิดขั้นนี้ (ทุกข้อความที่ไม่อยู่ใน cache ผ่านโมเดล)
+LEXICAL_TIER = os.getenv("LEXICAL_TIER", "1") != "0"
+LEXICAL_THRESHOLD = float(os.getenv("LEXICAL_THRESHOLD", 0.8))
+LEXICAL_MARGIN = float(os.getenv("LEXICAL_MARGIN", 0.15))
+# จำนวนร้านที่ตอบเมื่อผู้ใช้ส่งตำแหน่งหรือถามหาร้านใกล้สถานที่
+NEARBY_LIMIT = 3
+# ข้อความที่ไม่ตรงกับ intent ใดจะค้นหาร้านจากชื่อ ที่อยู่ เวลาทำการ และคำอธิบายแทน
+STORE_SEARCH_K = int(os.getenv("STORE_SEARCH_K", 3))
+# คะแนนขั้นต่ำอ่านจาก data/store_search_threshold.json ของโมเดลที่ใช้อยู่ (ตั้ง STORE_SEARCH_MIN_SCORE เพื่อบังคับค่า)
+# ถ้าโมเดลนี้ยังไม่ได้ปรับเทียบ จะค้นได้แค่ชื่อร้านที่ตรงกันพอดี ข้อความอื่นตอบว่าไม่เข้าใจเหมือนเดิม
+STORE_SEARCH_MIN_SCORE = os.getenv("STORE_SEARCH_MIN_SCORE")
+STORE_SEARCH_MODE = os.getenv("STORE_SEARCH_MODE", "auto")
+STORE_IVF_NPROBE = int(os.getenv("STORE_IVF_NPROBE", 16))
+# คำตอบที่เป็นรายการร้านส่งเป็น text (ค่าเริ่มต้น) หรือ flex (carousel แบบย่อ)
+REPLY_FORMAT = os.getenv("REPLY_FORMAT", "text")
+if REPLY_FORMAT not in reply_pages.FORMATS:
+    raise ValueError(f"REPLY_FORMAT ต้องเป็นหนึ่งใน {', '.join(reply_pages.FORMATS)}")
+# จำนวนร้านสูงสุดต่อหน้า 0 คือแบ่งหน้าตามขนาด message อย่างเดียว
+REPLY_PAGE_STORES = int(os.getenv("REPLY_PAGE_STORES", 0))
+
+# model, ข้อมูลร้าน และ intent index จะโหลดเมื่อถูกใช้ครั้งแรก (หรือตอน warm_up)
+# เพื่อให้ import logical ได้เร็วและ server ตอบ LINE verify ได้ทันที
+model = None
+_init_lock = threading.RLock()
+
+# เวลาที่ใช้ในแต่ละขั้นตอนตอนเริ่มต้น (วินาที)
+startup_timings = {}
+
+
+class BotState:
+    """ข้อมูลร้าน วลีของ intent, intent index, สถานที่สำคัญ และ index ของร้านชุดเดียวกัน
+
+    ตอน reload จะสร้าง BotState ใหม่ทั้งก้อนแล้วสลับ reference ทีเดียว
+    request ที่กำลังทำงานอยู่จึงเห็นข้อมูลชุดเก่าหรือชุดใหม่ชุดใดชุดหนึ่งเสมอ
+    """
+
+    __slots__ = ("intents", "catalogue", "index", "landmarks", "store_search", "lexical")
+
+    def __init__(self, intents, catalogue, index=None, landmarks=None, store_search=None):
+        self.intents = intents
+        self.catalogue = catalogue
+        self.index = index
+        self.landmarks = landmarks if landmarks is not None else Gazetteer([])
+        self.store_search = store_search
+        self.lexical = build_lexical(intents)
+
+
+def build_lexical(intents):
+    if not LEXICAL_TIER:
+        return None
+    # ใช้ label แบบแยก agree/disagree เพื่อไม่ให้ "ใช่" กับ "ไม่ใช่" ถูกนับเป็น intent เดียวกัน
+    return LexicalMatcher(
+        intents.combined, intents.fine_labels, threshold=LEXICAL_THRESHOLD, margin=LEXICAL_MARGIN
     )
-    corpus_vec = model.encode(corpus, convert_to_tensor=True, normalize_embeddings=True)
-    cosine_scores = util.cos_sim(question_vec, corpus_vec)
 
-    # แปลง tensor เป็น numpy array บน CPU
-    if hasattr(cosine_scores, "cpu"):
-        entity_vector = cosine_scores.cpu().numpy()
-    else:
-        entity_vector = np.array(cosine_scores)
 
-    score = np.max(entity_vector)
-    if score >= 0.6:
-        match_entity = corpus[np.argmax(entity_vector)]
+state = None
+
+# ผลการ reload ครั้งล่าสุด
+last_reload = {}
+_reload_lock = threading.Lock()
+
+
+def _timed(phase, load):
+    started = time.perf_counter()
+    value = load()
+    startup_timings[phase] = round(time.perf_counter() - started, 3)
+    return value
+
+
+def get_model():
+    global model
+    if model is None:
+        with _init_lock:
+            if model is None:
+                # backend เลือกด้วย ENCODER_BACKEND (torch, torch-int8, onnx)
+                model = _timed(
+                    "load_model",
+                    lambda: encoder.load_encoder(MODEL_NAME, timings=startup_timings),
+                )
+    return model
+
+
+def get_state():
+    global state
+    if state is None:
+        with _init_lock:
+            if state is None:
+                intents = _timed("load_intents", lambda: IntentSet.load(INTENTS_PATH))
+                stores = _timed("load_data", lambda: StoreCatalogue.from_csv(DATA_PATH))
+                landmarks = Gazetteer.load(LANDMARKS_PATH)
+                intent_cache.set_corpus(intents.combined)
+                state = BotState(intents, stores, landmarks=landmarks)
+    return state
+
+
+def get_catalogue():
+    return get_state().catalogue
+
+
+def get_intents():
+    return get_state().intents
+
+
+# สถานะบทสนทนาแยกตามผู้ใช้ แทน list user_input ที่เคยใช้ร่วมกันทั้ง process
+sessions = session_store.create_store()
+
+# cache ผลการจัด intent ตามข้อความที่ normalize แล้ว
+intent_cache = IntentCache(max_size=int(os.getenv("INTENT_CACHE_SIZE", 4096)))
+
+# index ของ corpus อื่นๆ ที่ไม่ใช่ combined corpus เก็บไว้ในหน่วยความจำเท่านั้น
+_corpus_indexes = {}
+
+
+def get_intent_index(corpus=None, bot_state=None):
+    bot_state = bot_state or get_state()
+    if corpus is None or corpus is bot_state.intents.combined:
+        if bot_state.index is None:
+            with _init_lock:
+                if bot_state.index is None:
+                    intents = bot_state.intents
+                    bot_state.index = _timed(
+                        "load_index",
+                        lambda: intent_index.load_or_build(
+                            get_model(), get_model().name, intents.combined, intents.labels
+                        ),
+                    )
+        return bot_state.index
+    key = tuple(corpus)
+    index = _corpus_indexes.get(key)
+    if index is None:
+        with _init_lock:
+            index = _corpus_indexes.get(key)
+            if index is None:
+                index = intent_index.IntentIndex(
+                    intent_index.encode_phrases(get_model(), corpus), corpus, list(corpus)
+                )
+                _corpus_indexes[key] = index
+    return index
+
+
+def _update_store_search(previous, catalogue):
+    return store_index.update_search(
+        previous,
+        get_model(),
+        get_model().name,
+        catalogue.search_texts,
+        catalogue.names,
+        mode=STORE_SEARCH_MODE,
+        nprobe=STORE_IVF_NPROBE,
+    )
+
+
+def get_store_search(bot_state=None):
+    bot_state = bot_state or get_state()
+    if bot_state.store_search is None:
+        with _init_lock:
+            if bot_state.store_search is None:
+                catalogue = bot_state.catalogue
+                bot_state.store_search = _timed(
+                    "load_store_index", lambda: _update_store_search(None, catalogue)[0]
+                )
+    return bot_state.store_search
+
+
+def is_ready():
+    return (
+        model is not None
+        and state is not None
+        and state.index is not None
+        and state.store_search is not None
+    )
+
+
+def warm_up():
+    started = time.perf_counter()
+    get_model()
+    get_state()
+    get_intent_index()
+    get_store_search()
+    startup_timings["warm_up_total"] = round(time.perf_counter() - started, 3)
+    return startup_timings
+
+
+def start_warm_up():
+    # โหลดทุกอย่างใน background thread เพื่อให้ server เริ่มรับ request ได้ก่อน
+    def run():
+        try:
+            warm_up()
+            log.info("✅ โหลด model และ index เรียบร้อย", extra=startup_timings)
+        except Exception:
+            log.exception("❌ Warm-up error")
+
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def reload_data():
+    # สร้างข้อมูลชุดใหม่ให้เสร็จก่อน แล้วค่อยสลับ state ทีเดียว
+    global state
+    with _reload_lock:
+        started = time.perf_counter()
+        previous = get_state()
+        intents = IntentSet.load(INTENTS_PATH)
+        stores = StoreCatalogue.from_csv(DATA_PATH)
+        landmarks = Gazetteer.load(LANDMARKS_PATH)
+        index = None
+        store_search = None
+        reembedded = 0
+        reembedded_stores = 0
+        if previous.index is not None:
+            # encode เฉพาะวลีที่เพิ่มเข้ามาใหม่ วลีเดิมใช้ embedding จาก index เก่า
+            index, reembedded = intent_index.update_index(
+                previous.index,
+                get_model(),
+                get_model().name,
+                intents.combined,
+                intents.labels,
+            )
+        if previous.store_search is not None:
+            # ร้านที่ข้อความไม่เปลี่ยนใช้ embedding เดิม
+            store_search, reembedded_stores = _update_store_search(previous.store_search, stores)
+        with _init_lock:
+            state = BotState(intents, stores, index, landmarks, store_search)
+            intent_cache.set_corpus(intents.combined)
+        last_reload.clear()
+        last_reload.update(
+            {
+                "duration": round(time.perf_counter() - started, 3),
+                "reembedded_rows": reembedded,
+                "reembedded_stores": reembedded_stores,
+                "phrases": len(intents.combined),
+                "stores": len(stores),
+                "located_stores": len(stores.locator),
+                "finished_at": time.time(),
+            }
+        )
+        return dict(last_reload)
+
+
+_reload_thread = None
+
+
+def start_reload(on_done=None):
+    """reload ใน background thread คืนค่า False ถ้ามี reload ที่เริ่มจากฟังก์ชันนี้กำลังทำงานอยู่"""
+    global _reload_thread
+
+    def run():
+        try:
+            report = reload_data()
+        except Exception:
+            log.exception("❌ Reload error")
+            return
+        if on_done is not None:
+            on_done(report)
+
+    with _init_lock:
+        if _reload_thread is not None and _reload_thread.is_alive():
+            return False
+        _reload_thread = threading.Thread(target=run, name="reload", daemon=True)
+        _reload_thread.start()
+    return True
+
+
+def is_reloading():
+    return _reload_thread is not None and _reload_thread.is_alive()
+
+
+def calculate_similarity_score(question, corpus):
+    index = get_intent_index(corpus)
+    # encode เฉพาะข้อความของผู้ใช้ แล้วเทียบกับ index ด้วย dot product ครั้งเดียว
+    question_vec = get_model().encode(
+        question, convert_to_numpy=True, normalize_embeddings=True
+    ).astype(np.float32)
+    row, score = index.best(question_vec)
+    return _match_result(index, row, score)
+
+
+def calculate_similarity_scores(questions, corpus, bot_state=None):
+    if not questions:
+        return []
+    index = get_intent_index(corpus, bot_state)
+    # encode ทุกข้อความในครั้งเดียว แล้วหาคะแนนทั้งหมดด้วยการคูณเมทริกซ์ครั้งเดียว
+    with STAGE_SECONDS.time("encode"):
+        question_vecs = get_model().encode(
+            list(questions), convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32)
+    with STAGE_SECONDS.time("score"):
+        scores = question_vecs @ index.matrix.T
+        rows = np.argmax(scores, axis=1)
+    return [
+        _match_result(index, int(row), float(scores[i, row]))
+        for i, row in enumerate(rows)
+    ]
+
+
+def _match_result(index, row, score):
+    if score >= INTENT_THRESHOLD:
+        match_entity = index.phrases[row]
         return [match_entity, score]
     else:
         return [
@@ -144,13 +331,59 @@ def calculate_similarity_score(question, corpus):
         ]
 
 
-def greeting_filtering(input):
+def lexical_match(keys, bot_state):
+    """ผลของขั้น lexical ต่อข้อความที่มั่นใจ {ข้อความ: [วลี, คะแนน]} ข้อความที่ไม่อยู่ใน dict ต้องใช้โมเดล"""
+    if bot_state.lexical is None or not keys:
+        return {}
+    combined = bot_state.intents.combined
+    matched = {}
+    with STAGE_SECONDS.time("lexical"):
+        for key in keys:
+            hit = bot_state.lexical.match(key)
+            if hit is not None:
+                row, score = hit
+                matched[key] = [combined[row], score]
+    return matched
+
+
+def classify_intents(questions, bot_state=None):
+    bot_state = bot_state or get_state()
+    # ดูใน cache ก่อน (รวมถึงวลีที่ตรงกับ corpus เป๊ะๆ) แล้วเทียบ n-gram
+    # encode ด้วยโมเดลเฉพาะข้อความที่ขั้น lexical ไม่มั่นใจ
+    generation = intent_cache.generation
+    keys = [normalize_utterance(question) for question in questions]
+    results = [intent_cache.get(key) for key in keys]
+    tiers = ["cache" if result is not None else None for result in results]
+    pending = list(dict.fromkeys(key for key, result in zip(keys, results) if result is None))
+    if pending:
+        scored = lexical_match(pending, bot_state)
+        lexical = set(scored)
+        remaining = [key for key in pending if key not in lexical]
+        scored.update(
+            zip(
+                remaining,
+                calculate_similarity_scores(remaining, bot_state.intents.combined, bot_state),
+            )
+        )
+        for key, result in scored.items():
+            intent_cache.put(key, result, generation)
+        tiers = [
+            tier or ("lexical" if key in lexical else "model") for key, tier in zip(keys, tiers)
+        ]
+        results = [result or scored[key] for key, result in zip(keys, results)]
+    for tier in tiers:
+        INTENT_TIER_TOTAL.inc(tier)
+    return results
+
+
+def greeting_filtering(input, intents=None):
+    intents = intents or get_intents()
     ans = ""
-    if input in question_greeting_corpus:
+    if input in intents.greeting:
         ans = (
             input + "ถามบอทน้อยเกี่ยวกับ (ร้านแฮงค์เอาท์ใกล้จตุจักร)หรือ(ร้านเหล้าแนะนำ) ได้เลยนะ !🍻"
         )
-    elif input in question_hangout_corpus:
+    elif input in intents.hangout:
         ans = (
             input
             + "หากพูดถึงร้านแฮงค์เอาท์บริเวณนี้บอทน้อยขอแนะนำให้ค้นหาว่า ร้านเหล้าใกล้จตุจักร หรือ ร้านแนะนำ"
@@ -158,39 +391,41 @@ def greeting_filtering(input):
     return ans
 
 
-def store_ranking_filtering(input):
+def store_ranking_filtering(input, bot_state=None):
+    bot_state = bot_state or get_state()
+    intents = bot_state.intents
     answer_sentence = ""
-    if input in asking_hangout_corpus:
+    if input in intents.asking_hangout:
         answer_sentence = "บอทน้อยสงสัยว่า คุณต้องการ(รายละเอียดร้าน)หรือ(รายชื่อร้าน)?"
-    elif input in question_stores_corpus:
-        hangout_ans_df = df[["ชื่อร้าน"]].to_dict(orient="records")
-        answer_sentence += f"บอทน้อยขอแนะนำ นี้คือรายชื่อร้านที่ดีที่สุดทั้งหมด \n"
-        answer_sentence += "\n"
-        for i in range(len(hangout_ans_df)):
-            for key, value in hangout_ans_df[i].items():
-                answer_sentence += f"ร้านที่ {i+1} : {value}" + "\n"
-        answer_sentence += "คุณสามารถถามรายละเอียดเพิ่มเติมได้เช่น ร้านแนะนำ ร้านเหล้าแนะนำ"
-    elif input in question_detail_corpus:
-        hangout_ans_df = df.to_dict(orient="records")
-        answer_sentence += f"บอทน้อยขอแนะนำ นี้คือรายละเอียดและชื่อร้าน \n"
-        answer_sentence += "\n"
-        for i in range(len(hangout_ans_df)):
-            for key, value in hangout_ans_df[i].items():
-                answer_sentence += f"{key} : {value}" + "\n"
-            answer_sentence += "\n"
-        answer_sentence += "คุณสามารถถามรายละเอียดเพิ่มเติมได้เช่น ร้านแนะนำ ร้านเหล้าแนะนำ"
+    elif input in intents.stores:
+        answer_sentence = Listing(
+            "names",
+            range(len(bot_state.catalogue)),
+            header="บอทน้อยขอแนะนำ นี้คือรายชื่อร้านที่ดีที่สุดทั้งหมด \n\n",
+            footer="คุณสามารถถามรายละเอียดเพิ่มเติมได้เช่น ร้านแนะนำ ร้านเหล้าแนะนำ",
+        )
+    elif input in intents.detail:
+        answer_sentence = Listing(
+            "details",
+            range(len(bot_state.catalogue)),
+            header="บอทน้อยขอแนะนำ นี้คือรายละเอียดและชื่อร้าน \n\n",
+            footer="คุณสามารถถามรายละเอียดเพิ่มเติมได้เช่น ร้านแนะนำ ร้านเหล้าแนะนำ",
+        )
     return answer_sentence
 
 
-def recommendation(input):
+def recommendation(input, session, bot_state=None):
+    bot_state = bot_state or get_state()
+    intents = bot_state.intents
+    user_input = session.answers
     message = "ไมทราบ"
-    if input in question_recommend_corpus:
+    if input in intents.recommend:
         user_input.clear()
         message = "🌃 ต้องการร้านเปิดหลังเที่ยงคืนไหม (ต้องการ, ไม่ต้องการ)"
-    elif input in question_thinking_corpus:
-        if input in agree_term:
+    elif input in intents.thinking:
+        if input in intents.agree:
             input = "ใช่"
-        elif input in disagree_term:
+        elif input in intents.disagree:
             input = "ไม่ใช่"
         user_input.append(input)
         len_user_input = len(user_input)
@@ -199,72 +434,262 @@ def recommendation(input):
         elif len_user_input == 2:
             message = "📞 ต้องการช่องทางการติดต่อไหม (ต้องการ, ไม่ต้องการ)"
         elif len_user_input == 3:
-            message = store(user_input)
+            message = store(user_input, bot_state.catalogue)
         else:
             message = "😫บอทน้อยพบว่าคุณใส่ความต้องการมากเกินไป กรุณาถามบอทน้อยอีกครั้งเช่น ร้านเหล้าใกล้จตุจักร ร้านเหล้า"
             user_input.clear()
     return message
 
 
-def store(input):
+def store(input, stores=None):
     late_input = input[0]
     parking_input = input[1]
     contact_input = input[2]
-    store_dataframe = df.copy()
-    if late_input == "ใช่":
-        store_dataframe = store_dataframe[store_dataframe["มีที่จอดรถ"] == "ใช่"]
-    elif late_input == "ไม่ใช่":
-        store_dataframe = store_dataframe[store_dataframe["มีที่จอดรถ"] == "ไม่ใช่"]
-    if parking_input == "ใช่":
-        store_dataframe = store_dataframe[store_dataframe["เปิดหลังเที่ยงคืน"] == "ใช่"]
-    elif parking_input == "ไม่ใช่":
-        store_dataframe = store_dataframe[store_dataframe["เปิดหลังเที่ยงคืน"] == "ไม่ใช่"]
-    if contact_input == "ใช่":
-        pass
-    if contact_input == "ไม่ใช่":
-        store_dataframe = store_dataframe.drop(
-            columns=["ช่องทางติดต่อ", "เว็บไซต์"], errors="ignore"
+    stores = stores or get_catalogue()
+    # คำตอบที่ไม่ใช่ ใช่/ไม่ใช่ ถือว่าไม่กรองด้วยเงื่อนไขนั้น
+    mask = stores.filter_mask(
+        late_night=late_input if late_input in ("ใช่", "ไม่ใช่") else None,
+        parking=parking_input if parking_input in ("ใช่", "ไม่ใช่") else None,
+    )
+    matched = stores.select(mask)
+    if matched:
+        return Listing(
+            "recommend_no_contact" if contact_input == "ไม่ใช่" else "recommend",
+            [record.position for record in matched],
+            header="บอทน้อยขอแนะนำร้านแฮงค์เอาท์ใกล้จตุจักรที่คุณต้องการ (^_^)\n\n",
+            footer="ขอบคุณที่สอบถามกับบอทน้อย😙 คุณสามารถสอบถามเกี่ยวกับร้านเหล้าได้เพิ่มเติมนะแล้วไว้เจอกันใหม่สวัสดีจ้าา!",
         )
-    store_dataframe = store_dataframe.drop(
-        columns=["อันดับ", "มีที่จอดรถ", "เปิดหลังเที่ยงคืน"], errors="ignore"
+    parts = [
+        f"บอทน้อยพบว่าร้านที่คุณต้องการไม่มีอยู่ในสมองอันชาญฉลาดของบอทน้อย",
+        "\n\n",
+        f"กรุณาค้นหา ร้านแนะนำ ใหม่อีกครั้ง",
+    ]
+    return "".join(parts)
+
+
+def nearby_stores(lat, lon, place=None, bot_state=None):
+    bot_state = bot_state or get_state()
+    locator = bot_state.catalogue.locator
+    if not len(locator):
+        return "บอทน้อยยังไม่รู้พิกัดของร้าน😢 ลองถาม (รายละเอียดร้าน) เพื่อดูที่อยู่ของร้านได้นะ"
+    with STAGE_SECONDS.time("nearby"):
+        nearest = locator.nearest(lat, lon, NEARBY_LIMIT)
+    title = f"ร้านใกล้ {place} ที่สุด" if place else "ร้านที่ใกล้คุณที่สุด"
+    return Listing(
+        "nearby",
+        [record.position for record, _ in nearest],
+        header=f"📍 {title} {len(nearest)} ร้าน\n\n",
+        footer="คุณสามารถถามรายละเอียดเพิ่มเติมได้เช่น ร้านแนะนำ ร้านเหล้าแนะนำ",
+        notes=[f"{km * 1000:.0f} ม." if km < 1 else f"{km:.1f} กม." for _, km in nearest],
     )
-    answer_sentence = ""
-    hangout_ans_df = store_dataframe.to_dict(orient="records")
-    len_hangout_ans = len(hangout_ans_df)
-    if len_hangout_ans > 0:
-        answer_sentence += f"บอทน้อยขอแนะนำร้านแฮงค์เอาท์ใกล้จตุจักรที่คุณต้องการ (^_^)"
-        answer_sentence += "\n\n"
-        for i in range(len_hangout_ans):
-            answer_sentence += f"ร้านที่ : {i+1}" + "\n"
-            for key, value in hangout_ans_df[i].items():
-                answer_sentence += f"{key} : {value}" + "\n"
-            answer_sentence += "\n"
-        answer_sentence += "ขอบคุณที่สอบถามกับบอทน้อย😙 คุณสามารถสอบถามเกี่ยวกับร้านเหล้าได้เพิ่มเติมนะแล้วไว้เจอกันใหม่สวัสดีจ้าา!"
-    else:
-        answer_sentence += f"บอทน้อยพบว่าร้านที่คุณต้องการไม่มีอยู่ในสมองอันชาญฉลาดของบอทน้อย"
-        answer_sentence += "\n\n"
-        answer_sentence += f"กรุณาค้นหา ร้านแนะนำ ใหม่อีกครั้ง"
-    return answer_sentence
 
 
-def chat_answer(input):
-    corpus = combined_question_corpus
-    output_corpus = calculate_similarity_score(input, corpus)
-    if input in asking_corpus:
-        answer = store_ranking_filtering(input)
-    elif output_corpus[0] in question_greeting_corpus:
-        answer = greeting_filtering(output_corpus[0])
-    elif output_corpus[0] in cancle_corpus:
-        user_input.clear()
+def location_answer(lat, lon, session_id="default"):
+    # ผู้ใช้ส่งตำแหน่งมาจาก LINE (location message)
+    INTENT_TOTAL.inc("location")
+    bot_state = get_state()
+    session = sessions.get(session_id)
+    messages = _paginate(nearby_stores(lat, lon, bot_state=bot_state), session, bot_state)
+    sessions.save(session)
+    return messages
+
+
+_store_min_score = {}
+
+
+def store_search_min_score():
+    """คะแนนขั้นต่ำของการค้นหาร้านด้วยโมเดล หรือ None ถ้ายังไม่ได้ปรับเทียบกับโมเดลที่ใช้อยู่"""
+    if STORE_SEARCH_MIN_SCORE is not None:
+        return float(STORE_SEARCH_MIN_SCORE)
+    name = get_model().name
+    if name not in _store_min_score:
+        _store_min_score[name] = store_index.load_threshold(name)
+        if _store_min_score[name] is None:
+            log.warning("⚠️  ยังไม่ได้ปรับเทียบเกณฑ์ค้นหาร้านกับโมเดลนี้ ค้นได้แค่ชื่อร้าน", extra={"model": name})
+    return _store_min_score[name]
+
+
+def search_stores(questions, bot_state=None, semantic=None):
+    """ร้านที่ตรงกับแต่ละข้อความ list ของ [(record, คะแนน), ...] เฉพาะร้านที่คะแนนถึงเกณฑ์
+
+    semantic[i] เป็น False คือข้อความนั้นเทียบได้แค่ชื่อร้าน ไม่ต้องค้นด้วยโมเดล
+    """
+    bot_state = bot_state or get_state()
+    if not questions or not len(bot_state.catalogue):
+        return [[] for _ in questions]
+    search = get_store_search(bot_state)
+    records = bot_state.catalogue.records
+    min_score = store_search_min_score()
+    if semantic is None:
+        semantic = [True] * len(questions)
+    if min_score is None:
+        semantic = [False] * len(questions)
+    # ข้อความที่เป็นชื่อร้านพอดีไม่ต้องผ่านโมเดล
+    named = [search.find_name(question) for question in questions]
+    pending = [
+        question
+        for question, row, allowed in zip(questions, named, semantic)
+        if row is None and allowed
+    ]
+    hits = iter([])
+    if pending:
+        with STAGE_SECONDS.time("encode"):
+            question_vecs = get_model().encode(
+                pending, convert_to_numpy=True, normalize_embeddings=True
+            ).astype(np.float32)
+        with STAGE_SECONDS.time("store_search"):
+            hits = iter(search.search(question_vecs, STORE_SEARCH_K))
+    results = []
+    for row, allowed in zip(named, semantic):
+        if row is not None:
+            results.append([(records[row], 1.0)])
+        elif allowed:
+            results.append([(records[hit], score) for hit, score in next(hits) if score >= min_score])
+        else:
+            results.append([])
+    return results
+
+
+def store_search_answer(input, hits):
+    return Listing(
+        "recommend",
+        [record.position for record, _ in hits],
+        header=f"🔎 บอทน้อยเจอร้านที่ตรงกับ \"{input}\" {len(hits)} ร้าน\n\n",
+        footer="คุณสามารถถามรายละเอียดเพิ่มเติมได้เช่น ร้านแนะนำ ร้านเหล้าแนะนำ",
+    )
+
+
+def _paginate(answer, session, bot_state, start=0):
+    # คำตอบหนึ่งข้อความคือ list ของ message ที่ส่งใน reply เดียว
+    # รายการร้านแบ่งเป็นหน้าตามข้อจำกัดของ LINE แล้วจำหน้าถัดไปไว้ใน session
+    if not isinstance(answer, Listing):
+        session.cursor = None
+        return [answer]
+    with STAGE_SECONDS.time("paginate"):
+        page = reply_pages.paginate(
+            answer, bot_state.catalogue.records, start, REPLY_FORMAT, REPLY_PAGE_STORES
+        )
+    PAGE_BYTES.observe(page.payload_bytes, REPLY_FORMAT)
+    session.cursor = (
+        answer.cursor(page.next_start, bot_state.catalogue.version)
+        if page.next_start is not None
+        else None
+    )
+    return page.messages
+
+
+def _next_page(session, bot_state):
+    listing, start = None, 0
+    if session.cursor is not None:
+        listing, start = Listing.from_cursor(
+            session.cursor, bot_state.catalogue.records, bot_state.catalogue.version
+        )
+    if listing is None:
+        session.cursor = None
+        return ["บอทน้อยไม่มีรายชื่อร้านให้ดูต่อแล้ว ลองถาม (รายชื่อร้าน) หรือ (ร้านแนะนำ) ใหม่ได้เลย"]
+    INTENT_TOTAL.inc("more")
+    return _paginate(listing, session, bot_state, start)
+
+
+def _find_landmark(text, bot_state):
+    # วลีในกลุ่ม asking (เช่น "ร้านเหล้าใกล้จตุจักร") มีคำตอบของตัวเองอยู่แล้ว
+    if text in bot_state.intents.asking or not len(bot_state.catalogue.locator):
+        return None
+    return bot_state.landmarks.find(text)
+
+
+def chat_answer(input, session_id="default"):
+    return chat_answers([(input, session_id)])[0]
+
+
+def chat_answers(messages):
+    # messages คือ list ของ (ข้อความ, session_id) ตามลำดับที่ได้รับ
+    # คืนค่า list ของคำตอบ แต่ละคำตอบเป็น list ของ message (str หรือ dict ของ Flex message)
+    # ใช้ state ชุดเดียวตลอดทั้ง request แม้จะมีการ reload ระหว่างนั้น
+    bot_state = get_state()
+    # ข้อความจากผู้ใช้คนเดียวกันใน request เดียวใช้ session object เดียวกัน
+    loaded = {}
+    for _, session_id in messages:
+        if session_id not in loaded:
+            loaded[session_id] = sessions.get(session_id)
+    texts = [text for text, _ in messages]
+    # "ต่อ" ขอหน้าถัดไปของรายการร้านล่าสุด และคำถามแบบ "ร้านใกล้ X" ตอบจากพิกัดของสถานที่
+    # ทั้งสองแบบไม่ต้องผ่านโมเดล
+    more = [
+        reply_pages.is_more(text) and loaded[session_id].cursor is not None
+        for text, session_id in messages
+    ]
+    landmarks = [
+        None if wants_more else _find_landmark(text, bot_state)
+        for text, wants_more in zip(texts, more)
+    ]
+    # วลีในกลุ่ม asking ตอบจากข้อมูลร้านโดยไม่ดูผลจากโมเดล จึงไม่ต้องจัด intent
+    intents = bot_state.intents
+    pending = [
+        text
+        for text, wants_more, landmark in zip(texts, more, landmarks)
+        if not wants_more and landmark is None and text not in intents.asking
+    ]
+    outputs = classify_intents(pending, bot_state)
+    # ข้อความที่ไม่ตรงกับ intent ที่มีคำตอบลองค้นหาจากข้อมูลร้านแทน ค้นด้วยโมเดลเฉพาะข้อความที่คะแนนต่ำกว่าเกณฑ์
+    # ข้อความที่ตรงกับวลีที่ไม่มีคำตอบ (เช่นกลุ่ม ranking/location) เทียบได้แค่ชื่อร้าน ไม่งั้นจะได้ร้านที่ไม่เกี่ยวข้อง
+    weak = {}
+    for text, output in zip(pending, outputs):
+        if output[0] not in intents.answered:
+            weak.setdefault(text, output[1] < INTENT_THRESHOLD)
+    found = dict(zip(weak, search_stores(list(weak), bot_state, list(weak.values()))))
+    outputs = iter(outputs)
+    answers = []
+    for (text, session_id), wants_more, landmark in zip(messages, more, landmarks):
+        session = loaded[session_id]
+        if wants_more:
+            answers.append(_next_page(session, bot_state))
+        elif landmark is not None:
+            INTENT_TOTAL.inc("nearby")
+            answer = nearby_stores(landmark.lat, landmark.lon, landmark.name, bot_state)
+            answers.append(_paginate(answer, session, bot_state))
+        else:
+            output = [text, 1.0] if text in intents.asking else next(outputs)
+            with STAGE_SECONDS.time("render"):
+                answer = _route_answer(text, output, session, bot_state, found.get(text))
+            answers.append(_paginate(answer, session, bot_state))
+        sessions.save(session)
+    return answers
+
+
+def _route_answer(input, output_corpus, session, bot_state, store_hits=None):
+    intents = bot_state.intents
+    intent = "fallback"
+    if input in intents.asking:
+        intent = "asking"
+        answer = store_ranking_filtering(input, bot_state)
+    elif output_corpus[0] in intents.greeting:
+        intent = "greeting"
+        answer = greeting_filtering(output_corpus[0], intents)
+    elif output_corpus[0] in intents.cancel:
+        intent = "cancel"
+        session.answers.clear()
         answer = f"[คุณยกเลิกการแนะนำร้านแล้ว!]บอทน้อยเข้าใจว่าคุณใจโลเลไม่รักจริง😳🔥 \n\nแต่คุณยังสามารถสอบถาม(ร้านเหล้าแนะนำ)หรือ(ร้านเหล้าใกล้จตุจักร)ได้น้าา!!"
-    elif output_corpus[0] in asking_thank_corpus:
+    elif output_corpus[0] in intents.thank:
+        intent = "thank"
         answer = "ขอบคุณที่สอบถามกับบอทน้อย😙 คุณสามารถสอบถามเกี่ยวกับร้านเหล้าได้เพิ่มเติมนะแล้วไว้เจอกันใหม่สวัสดีจ้าา!"
-    elif output_corpus[0] in question_hangout_corpus:
-        answer = greeting_filtering(output_corpus[0])
-    elif output_corpus[0] in question_recommend_corpus:
-        answer = recommendation(output_corpus[0])
-    elif output_corpus[0] in question_thinking_corpus:
-        answer = recommendation(output_corpus[0])
+    elif output_corpus[0] in intents.hangout:
+        intent = "hangout"
+        answer = greeting_filtering(output_corpus[0], intents)
+    elif output_corpus[0] in intents.recommend:
+        intent = "recommend"
+        answer = recommendation(output_corpus[0], session, bot_state)
+    elif output_corpus[0] in intents.thinking:
+        intent = "thinking"
+        answer = recommendation(output_corpus[0], session, bot_state)
+    elif store_hits:
+        intent = "store_search"
+        answer = store_search_answer(input, store_hits)
     else:
+        # คะแนนต่ำกว่าเกณฑ์ หรือได้วลีที่ไม่มีคำตอบ (เช่นกลุ่ม ranking/location)
+        FALLBACK_TOTAL.inc(
+            "low_score" if output_corpus[1] < INTENT_THRESHOLD else "unhandled_intent"
+        )
         answer = f"{input} บอทน้อยไม่เข้าใจ😭กรุณาถามบอทน้อยอีกครั้งเช่น ร้านเหล้าใกล้จตุจักร ร้านเหล้า"
+    INTENT_TOTAL.inc(intent)
     return answer
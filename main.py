@@ -1,19 +1,26 @@
-from flask import Flask, request, abort
-from linebot.v3.messaging import (
-    MessagingApi,
-    Configuration,
-    ApiClient,
-    ReplyMessageRequest,
-    TextMessage,
-)
-from linebot.v3.webhook import WebhookHandler
+from flask import Flask, Response, request, abort
+from linebot.v3.messaging import FlexMessage, TextMessage
+from linebot.v3.webhook import SignatureValidator
 from linebot.v3.exceptions import InvalidSignatureError
 from dotenv import load_dotenv
+import atexit
+import hmac
 import json
+import logging
 import os
-from logical import chat_answer
+import signal
+import sys
+import logical
+from logical import chat_answers, location_answer
+from logging_setup import DroppingQueueHandler, setup_logging
+from metrics import REGISTRY, STAGE_SECONDS, Gauge
+from reply_client import create_dispatcher, push_target
+from reply_worker import ReplyWorkerPool
+from reloader import FileWatcher
 
 load_dotenv()
+setup_logging()
+log = logging.getLogger("linebot")
 
 app = Flask(__name__)
 
@@ -21,15 +28,207 @@ ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 SECRET = os.getenv("SECRET")
 
 if not ACCESS_TOKEN or not SECRET:
-    print("⚠️  ACCESS_TOKEN หรือ SECRET ไม่ถูกต้อง กรุณาตรวจสอบไฟล์ .env")
+    log.critical("⚠️  ACCESS_TOKEN หรือ SECRET ไม่ถูกต้อง กรุณาตรวจสอบไฟล์ .env")
+    logging.shutdown()
     exit(1)
 
-configuration = Configuration(access_token=ACCESS_TOKEN)
-api_client = ApiClient(configuration)
-line_bot_api = MessagingApi(api_client)
-handler = WebhookHandler(SECRET)
+# LINE_API_HOST ใช้ชี้ไปที่ stub ของ Messaging API ตอนทดสอบ (tools/stub_line_api.py)
+# REPLY_POOL_SIZE, REPLY_TIMEOUT, REPLY_MAX_RETRIES ฯลฯ ปรับได้ใน reply_client.create_dispatcher
+reply_dispatcher = create_dispatcher(ACCESS_TOKEN, host=os.getenv("LINE_API_HOST") or None)
+atexit.register(reply_dispatcher.close)
+signature_validator = SignatureValidator(SECRET)
+
+log.info("✅ โหลด ACCESS_TOKEN และ SECRET เรียบร้อย")
+
+# WARMUP=background (ค่าเริ่มต้น) โหลด model ใน background, eager โหลดให้เสร็จก่อนเปิด server,
+# lazy โหลดตอนมีข้อความแรกเข้ามา
+WARMUP = os.getenv("WARMUP", "background")
+
+# ADMIN_TOKEN เปิดใช้ POST /admin/reload, RELOAD_INTERVAL (วินาที) เปิดการตรวจไฟล์ข้อมูลอัตโนมัติ
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+RELOAD_INTERVAL = float(os.getenv("RELOAD_INTERVAL", 0))
+
+
+def session_key(event):
+    # แยกบทสนทนาตามผู้ใช้ ถ้าอยู่ในกลุ่ม/ห้องให้แยกตามผู้ใช้ในกลุ่มนั้นด้วย
+    source = event.get("source", {})
+    user_id = source.get("userId", "")
+    group_id = source.get("groupId") or source.get("roomId")
+    if group_id:
+        return f"{group_id}:{user_id}"
+    return user_id or "default"
+
+
+# ชนิดของ message ที่บอทตอบ
+HANDLED_MESSAGES = ("text", "location")
+
+
+def line_messages(answer):
+    # คำตอบหนึ่งข้อความมีได้หลาย message (ไม่เกิน 5) str คือ text message, dict คือ Flex message
+    return [
+        FlexMessage.from_dict(message) if isinstance(message, dict) else TextMessage(text=message)
+        for message in answer
+    ]
+
+
+def handle_message_events(message_events):
+    # ประมวลผลทุกข้อความพร้อมกัน (encode เป็น batch เดียว)
+    text_events = [event for event in message_events if event["message"]["type"] == "text"]
+    text_answers = iter(
+        chat_answers([(event["message"]["text"], session_key(event)) for event in text_events])
+    )
 
-print(f"✅ โหลด ACCESS_TOKEN และ SECRET เรียบร้อย")
+    replies = []
+    for event in message_events:
+        message = event["message"]
+        if message["type"] == "location":
+            # ผู้ใช้แชร์ตำแหน่ง ตอบร้านที่ใกล้ที่สุด
+            answer = location_answer(
+                message["latitude"], message["longitude"], session_key(event)
+            )
+        else:
+            msg = message["text"]
+            log.debug("💬 ข้อความ", extra={"text": msg})
+            answer = next(text_answers)
+            answer = answer if msg else ["บอทน้อยไม่เข้าใจ"]
+        replies.append((event["replyToken"], line_messages(answer), push_target(event)))
+
+    # ส่งข้อความตอบกลับพร้อมกัน แยก replyToken ของแต่ละ event
+    results = reply_dispatcher.send_many(replies)
+    log.info("✅ ตอบกลับ", extra={"replies": len(results), "failed": results.count("failed")})
+
+
+# ASYNC_REPLY=1 ตอบ webhook ทันทีแล้วให้ worker pool ทำ inference และส่งข้อความตอบกลับ
+reply_pool = None
+if os.getenv("ASYNC_REPLY") == "1":
+    reply_pool = ReplyWorkerPool(
+        handle_message_events,
+        workers=int(os.getenv("REPLY_WORKERS", 2)),
+        max_queue=int(os.getenv("REPLY_QUEUE_SIZE", 1000)),
+        max_batch=int(os.getenv("REPLY_BATCH_SIZE", 16)),
+    )
+    atexit.register(reply_pool.shutdown)
+
+REGISTRY.register(
+    Gauge(
+        "linebot_reply_queue_depth",
+        "Events waiting for a reply worker",
+        lambda: reply_pool.depth() if reply_pool is not None else 0,
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "linebot_reply_queue_shed_total",
+        "Events rejected because the reply queue was full",
+        lambda: reply_pool.shed if reply_pool is not None else 0,
+        kind="counter",
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "linebot_live_sessions",
+        "Conversations currently held in the session store",
+        lambda: logical.sessions.stats()["live_sessions"],
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "linebot_session_evictions_total",
+        "Sessions evicted by TTL or the session cap",
+        lambda: logical.sessions.stats()["evictions"],
+        kind="counter",
+    )
+)
+for _name in ("hits", "exact_hits", "misses", "evictions"):
+    REGISTRY.register(
+        Gauge(
+            f"linebot_intent_cache_{_name}_total",
+            f"Intent cache {_name.replace('_', ' ')}",
+            lambda name=_name: logical.intent_cache.stats()[name],
+            kind="counter",
+        )
+    )
+REGISTRY.register(
+    Gauge(
+        "linebot_log_dropped_total",
+        "Log records dropped because the log queue was full",
+        lambda: DroppingQueueHandler.dropped,
+        kind="counter",
+    )
+)
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return "OK", 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    status = 200 if logical.is_ready() else 503
+    return {"ready": status == 200, "startup_timings": logical.startup_timings}, status
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return {
+        "intent_cache": logical.intent_cache.stats(),
+        "sessions": logical.sessions.stats(),
+        "reply_queue": reply_pool.stats() if reply_pool is not None else None,
+        "last_reload": logical.last_reload,
+        "reloading": logical.is_reloading(),
+    }
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    token = request.headers.get("X-Admin-Token", "")
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        abort(404)
+    # โหลดข้อมูลชุดใหม่ใน background แล้วสลับ state ทีเดียว request นี้จึงไม่ต้องรอ encode
+    # ผลของการ reload ดูได้จาก last_reload ใน GET /stats
+    if not logical.start_reload(
+        lambda report: log.info("🔄 Reload ข้อมูลเรียบร้อย", extra=report)
+    ):
+        return {"started": False, "reason": "reload กำลังทำงานอยู่"}, 409
+    return {"started": True}, 202
+
+
+def reload_from_watcher():
+    report = logical.reload_data()
+    log.info("🔄 ไฟล์ข้อมูลเปลี่ยน reload เรียบร้อย", extra=report)
+
+
+# สร้างตั้งแต่ import เพื่อจำ mtime ของไฟล์ไว้ก่อนโหลดข้อมูล
+# worker ที่ fork ทีหลังจึงยังเห็นว่าไฟล์เปลี่ยนไปจากข้อมูลที่ได้มาจาก process แม่
+file_watcher = None
+if RELOAD_INTERVAL > 0:
+    file_watcher = FileWatcher(
+        [logical.DATA_PATH, logical.INTENTS_PATH, logical.LANDMARKS_PATH],
+        reload_from_watcher,
+        interval=RELOAD_INTERVAL,
+    )
+
+
+def start_background():
+    # thread ไม่ติดไปกับ process ลูกหลัง fork ตอนรันด้วย gunicorn จึงเรียกใน post_fork ของแต่ละ worker
+    # (ถ้าไม่ได้เรียก reply_pool จะเริ่ม worker เองตอน submit ครั้งแรก)
+    if reply_pool is not None:
+        reply_pool.start()
+    if file_watcher is not None:
+        file_watcher.start()
+
+
+def stop_background():
+    if file_watcher is not None:
+        file_watcher.stop()
+    if reply_pool is not None:
+        reply_pool.shutdown()
 
 
 @app.route("/", methods=["POST"])
@@ -39,65 +238,74 @@ def linebot():
 
     # กรณี LINE Verify Webhook (ไม่มี signature)
     if not signature:
-        print("📝 LINE Verify Webhook - ตอบกลับ 200 OK")
+        log.info("📝 LINE Verify Webhook - ตอบกลับ 200 OK")
         return "OK", 200
 
-    print(f"📨 รับข้อความ: signature={signature[:20]}...")
-
     try:
         # ตรวจสอบ signature
-        handler.handle(body, signature)
+        with STAGE_SECONDS.time("verify_signature"):
+            if not signature_validator.validate(body, signature):
+                raise InvalidSignatureError("Invalid signature")
 
         # จัดการข้อความ
-        json_data = json.loads(body)
+        with STAGE_SECONDS.time("parse"):
+            json_data = json.loads(body)
         events = json_data.get("events", [])
+        log.debug("📨 รับ events", extra={"events": len(events)})
 
         if not events:
-            print("⚠️  ไม่มี events ใน request")
+            log.info("⚠️  ไม่มี events ใน request")
             return "OK", 200
 
-        event = events[0]
+        # LINE อาจรวมหลาย event มาใน request เดียว ต้องตอบให้ครบทุก event
+        message_events = []
+        for event in events:
+            # เช็คว่าเป็น text หรือ location message หรือไม่
+            if (
+                event.get("type") != "message"
+                or event.get("message", {}).get("type") not in HANDLED_MESSAGES
+            ):
+                log.debug("ℹ️  ไม่ใช่ข้อความที่ตอบได้ - ข้าม", extra={"type": event.get("type")})
+                continue
+            message_events.append(event)
 
-        # เช็คว่าเป็น text message หรือไม่
-        if (
-            event.get("type") != "message"
-            or event.get("message", {}).get("type") != "text"
-        ):
-            print("ℹ️  ไม่ใช่ text message - ข้าม")
+        if not message_events:
             return "OK", 200
 
-        msg = event["message"]["text"]
-        tk = event["replyToken"]
-
-        print(f"💬 ข้อความ: {msg}")
-
-        # ประมวลผลข้อความด้วย chatbot logic
-        reply_msg = chat_answer(msg) if msg else "บอทน้อยไม่เข้าใจ"
-
-        # ส่งข้อความตอบกลับ
-        line_bot_api.reply_message(
-            ReplyMessageRequest(replyToken=tk, messages=[TextMessage(text=reply_msg)])
-        )
+        if reply_pool is not None:
+            # ตอบ 200 ทันที แล้วให้ worker ประมวลผลและส่งข้อความตอบกลับทีหลัง
+            if not reply_pool.submit(message_events):
+                log.warning("⚠️  คิวเต็ม - ไม่รับ events", extra={"events": len(message_events)})
+                return "Busy", 503
+            return "OK", 200
 
-        print(f"✅ ตอบกลับ: {reply_msg[:50]}...")
+        handle_message_events(message_events)
 
     except InvalidSignatureError:
-        print("❌ Invalid signature")
+        log.warning("❌ Invalid signature")
         abort(403)
 
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        print(f"   Body: {body}")
+    except Exception:
+        # ไม่ log body เพราะมีข้อความของผู้ใช้และมีขนาดใหญ่
+        log.exception("❌ Error", extra={"body_bytes": len(body)})
 
     return "OK", 200
 
 
 if __name__ == "__main__":
     try:
-        print("🚀 เริ่มต้น LINE ChatBot...")
+        log.info("🚀 เริ่มต้น LINE ChatBot...")
+        # ให้ SIGTERM ออกผ่าน atexit เพื่อรอส่งข้อความที่ค้างในคิวให้หมดก่อน
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        if WARMUP == "eager":
+            logical.warm_up()
+            log.info("✅ โหลด model และ index เรียบร้อย", extra=logical.startup_timings)
+        elif WARMUP == "background":
+            logical.start_warm_up()
+        start_background()
         port = int(os.environ.get("PORT", 10000))
         app.run(host="0.0.0.0", port=port, debug=False)
     except KeyboardInterrupt:
-        print("\n👋 หยุดทำงาน")
-    except Exception as e:
-        print(f"❌ เกิดข้อผิดพลาด: {e}")
+        log.info("👋 หยุดทำงาน")
+    except Exception:
+        log.exception("❌ เกิดข้อผิดพลาด")
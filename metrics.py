@@ -0,0 +1,199 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# ขอบของ bucket (วินาที) ครอบคลุมตั้งแต่ dot product ไปจนถึง HTTP call ที่ช้า
+DEFAULT_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """ค่าที่อ่านจาก callback ตอนถูก scrape เช่นความยาวคิวหรือจำนวน session
+
+    kind="counter" ใช้กับตัวนับที่ส่วนอื่นเก็บไว้เอง เช่น hit/miss ของ cache
+    """
+
+    def __init__(self, name, documentation, callback, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            value = self.callback()
+        except Exception:
+            return lines
+        if value is not None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # labels -> [จำนวนต่อ bucket, ผลรวม, จำนวนทั้งหมด]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    label_text = _format_labels(
+                        self.labelnames, labels, ("le", _format_value(bound))
+                    )
+                    lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+                label_text = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_text} {total}")
+                lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        # ลงทะเบียนชื่อเดิมซ้ำจะแทนที่ของเดิม (เช่น gauge ที่สร้างใหม่หลัง reload)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "linebot_stage_seconds",
+        "Time spent in each stage of handling a webhook",
+        labelnames=("stage",),
+    )
+)
+INTENT_TOTAL = REGISTRY.register(
+    Counter("linebot_intent_total", "Messages answered per matched intent", ("intent",))
+)
+INTENT_TIER_TOTAL = REGISTRY.register(
+    Counter(
+        "linebot_intent_tier_total",
+        "Messages classified by each tier (cache, lexical, model)",
+        ("tier",),
+    )
+)
+FALLBACK_TOTAL = REGISTRY.register(
+    Counter(
+        "linebot_fallback_total",
+        "Messages the bot did not understand (บอทน้อยไม่เข้าใจ)",
+        ("reason",),
+    )
+)
+REPLY_TOTAL = REGISTRY.register(
+    Counter(
+        "linebot_reply_total",
+        "Replies handed to the Messaging API by outcome (reply, push, failed)",
+        ("result",),
+    )
+)
+REPLY_RETRY_TOTAL = REGISTRY.register(
+    Counter(
+        "linebot_reply_retries_total",
+        "Messaging API calls retried after 429, 5xx or a network error",
+        ("reason",),
+    )
+)
+PAGE_BYTES = REGISTRY.register(
+    Histogram(
+        "linebot_reply_page_bytes",
+        "JSON size of one page of a store listing reply, by output format",
+        labelnames=("format",),
+        buckets=(500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+    )
+)
@@ -0,0 +1,50 @@
+import logging
+import os
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class FileWatcher:
+    """ตรวจ mtime ของไฟล์ทุก interval วินาที แล้วเรียก on_change เมื่อมีไฟล์เปลี่ยน"""
+
+    def __init__(self, paths, on_change, interval=5.0):
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self._mtimes = self._snapshot()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _snapshot(self):
+        mtimes = {}
+        for path in self.paths:
+            try:
+                mtimes[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[path] = None
+        return mtimes
+
+    def check(self):
+        current = self._snapshot()
+        if current == self._mtimes:
+            return False
+        self._mtimes = current
+        self.on_change()
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                # ไฟล์อาจกำลังเขียนอยู่ รอบถัดไปจะลองใหม่
+                self._mtimes = {}
+                log.exception("❌ Reload error")
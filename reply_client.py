@@ -0,0 +1,215 @@
+import logging
+import os
+import random
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import urllib3
+from linebot.v3.messaging import (
+    ApiClient,
+    ApiException,
+    Configuration,
+    MessagingApi,
+    PushMessageRequest,
+    ReplyMessageRequest,
+)
+
+from metrics import REPLY_RETRY_TOTAL, REPLY_TOTAL, STAGE_SECONDS
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 3.0
+DEFAULT_READ_TIMEOUT = 10.0
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_SEND_WORKERS = 4
+
+
+class ReplyDispatcher:
+    """ส่งข้อความตอบกลับผ่าน Messaging API ด้วย connection pool ที่ใช้ซ้ำ (keep-alive)
+
+    ลองใหม่เมื่อเจอ 429/5xx หรือเครือข่ายขัดข้อง (exponential backoff แบบ full jitter)
+    ถ้า reply token หมดอายุเพราะตอบช้า จะส่งแบบ push ไปหาผู้ใช้/กลุ่มแทน
+    """
+
+    def __init__(
+        self,
+        access_token,
+        host=None,
+        pool_size=DEFAULT_POOL_SIZE,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=0.2,
+        max_backoff=2.0,
+        send_workers=DEFAULT_SEND_WORKERS,
+        push_fallback=True,
+    ):
+        configuration = Configuration(host=host, access_token=access_token)
+        # ขนาด pool ต้องไม่น้อยกว่าจำนวน thread ที่ส่งพร้อมกัน ไม่งั้น urllib3 ต้องเปิด connection ทิ้ง
+        configuration.connection_pool_maxsize = max(pool_size, send_workers)
+        # ปิด retry ของ urllib3 เพราะเราจัดการเองที่นี่
+        configuration.retries = False
+        self.api_client = ApiClient(configuration)
+        self.api = MessagingApi(self.api_client)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.push_fallback = push_fallback
+        self._executor = ThreadPoolExecutor(
+            max_workers=send_workers, thread_name_prefix="reply-send"
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.api_client.close()
+
+    def reply(self, reply_token, messages, push_to=None):
+        """ส่งข้อความด้วย reply token คืนค่า "reply", "push" หรือ "failed" """
+        try:
+            with STAGE_SECONDS.time("reply"):
+                self._call(
+                    lambda: self.api.reply_message(
+                        ReplyMessageRequest(replyToken=reply_token, messages=messages),
+                        _request_timeout=self.timeout,
+                    )
+                )
+            result = "reply"
+        except ApiException as e:
+            if not _is_invalid_reply_token(e):
+                result = self._failed("reply", e)
+            elif getattr(e, "ambiguous", False):
+                # รอบก่อนหน้า timeout หลังส่ง request ไปแล้ว LINE อาจส่งข้อความไปแล้วจึงใช้ token ไม่ได้
+                # ไม่ push ซ้ำเพื่อไม่ให้ผู้ใช้ได้ข้อความสองครั้ง
+                log.warning("⚠️  Reply token ถูกใช้ไปแล้ว - ไม่ส่งซ้ำ")
+                result = "reply"
+            elif push_to and self.push_fallback:
+                log.info("⏰ Reply token หมดอายุ - ส่งแบบ push แทน")
+                result = self.push(push_to, messages)
+            else:
+                result = self._failed("reply", e)
+        except Exception as e:
+            result = self._failed("reply", e)
+        REPLY_TOTAL.inc(result)
+        return result
+
+    def push(self, to, messages):
+        # retry key เดิมทุกรอบ LINE จะไม่ส่งซ้ำถ้ารอบก่อนสำเร็จไปแล้ว (ตอบ 409)
+        retry_key = str(uuid.uuid4())
+        try:
+            with STAGE_SECONDS.time("push"):
+                self._call(
+                    lambda: self.api.push_message(
+                        PushMessageRequest(to=to, messages=messages),
+                        x_line_retry_key=retry_key,
+                        _request_timeout=self.timeout,
+                    )
+                )
+        except ApiException as e:
+            if e.status != 409:
+                return self._failed("push", e)
+        except Exception as e:
+            return self._failed("push", e)
+        return "push"
+
+    def send_many(self, replies):
+        """ส่งหลายข้อความพร้อมกัน replies เป็น list ของ (reply_token, messages, push_to)"""
+        replies = list(replies)
+        if len(replies) <= 1:
+            return [self.reply(*item) for item in replies]
+        pending = []
+        for item in replies:
+            try:
+                pending.append(self._executor.submit(self.reply, *item))
+            except RuntimeError:
+                # ตอน interpreter กำลังปิด concurrent.futures ไม่รับงานใหม่ตั้งแต่ก่อน atexit
+                # ที่รอให้คิวตอบกลับว่าง จึงส่งข้อความที่เหลือทีละข้อความใน thread นี้แทน
+                pending.append(item)
+        return [
+            item.result() if isinstance(item, Future) else self.reply(*item) for item in pending
+        ]
+
+    def _call(self, send):
+        # ambiguous คือเคยมีรอบที่ขาดการติดต่อหลังส่ง request ไปแล้ว (ไม่รู้ว่า LINE ได้รับหรือยัง)
+        ambiguous = False
+        attempt = 0
+        while True:
+            try:
+                return send()
+            except ApiException as e:
+                e.ambiguous = ambiguous
+                if attempt >= self.max_retries or not _is_retryable(e.status):
+                    raise
+                reason = str(e.status)
+                delay = _retry_after(e)
+            except (urllib3.exceptions.HTTPError, OSError) as e:
+                if attempt >= self.max_retries:
+                    raise
+                ambiguous = ambiguous or _maybe_delivered(e)
+                reason = "network"
+                delay = None
+            if delay is None:
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+            attempt += 1
+            REPLY_RETRY_TOTAL.inc(reason)
+            log.debug("🔁 ลองส่งใหม่", extra={"reason": reason, "attempt": attempt})
+            time.sleep(min(delay, self.max_backoff))
+
+    def _failed(self, kind, error):
+        log.error(
+            "❌ ส่งข้อความไม่สำเร็จ",
+            extra={
+                "kind": kind,
+                "status": getattr(error, "status", None),
+                "error": getattr(error, "reason", None) or repr(error),
+            },
+        )
+        return "failed"
+
+
+def _is_retryable(status):
+    return status == 429 or (status is not None and status >= 500)
+
+
+def _is_invalid_reply_token(error):
+    body = error.body or b""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return error.status == 400 and b"invalid reply token" in body.lower()
+
+
+def _retry_after(error):
+    try:
+        return float((error.headers or {}).get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _maybe_delivered(error):
+    # read timeout / connection ถูกตัดระหว่างรอคำตอบ แปลว่า request อาจไปถึง LINE แล้ว
+    # ต่างจาก connect timeout ที่ request ยังไม่ออกจากเครื่องแน่นอน
+    return not isinstance(
+        error,
+        (urllib3.exceptions.ConnectTimeoutError, urllib3.exceptions.NewConnectionError),
+    )
+
+
+def push_target(event):
+    # push ต้องส่งกลับไปที่ห้องเดิม ถ้าข้อความมาจากกลุ่ม/ห้องให้ส่งเข้ากลุ่มนั้น
+    source = event.get("source", {})
+    return source.get("groupId") or source.get("roomId") or source.get("userId")
+
+
+def create_dispatcher(access_token, host=None):
+    return ReplyDispatcher(
+        access_token,
+        host=host,
+        pool_size=int(os.getenv("REPLY_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        connect_timeout=float(os.getenv("REPLY_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+        read_timeout=float(os.getenv("REPLY_TIMEOUT", DEFAULT_READ_TIMEOUT)),
+        max_retries=int(os.getenv("REPLY_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+        send_workers=int(os.getenv("REPLY_SEND_WORKERS", DEFAULT_SEND_WORKERS)),
+        push_fallback=os.getenv("REPLY_PUSH_FALLBACK", "1") == "1",
+    )
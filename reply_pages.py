@@ -0,0 +1,240 @@
+import json
+
+from catalogue import MAP_COLUMN, MISSING_VALUE
+
+# ข้อจำกัดของ Messaging API ต่อหนึ่ง reply
+MAX_MESSAGES = 5
+# ความยาวสูงสุดของ text message นับเป็น UTF-16 code unit (emoji นับเป็น 2)
+MAX_TEXT_LENGTH = 5000
+MAX_ALT_TEXT_LENGTH = 400
+MAX_BUBBLES = 12
+# ขนาด JSON สูงสุดของ Flex carousel หนึ่งอัน (ไบต์)
+MAX_CAROUSEL_BYTES = 50000
+
+FORMATS = ("text", "flex")
+# ข้อความที่ขอดูหน้าถัดไปของรายการล่าสุด
+MORE_WORDS = ("ต่อ", "more", "next", "ถัดไป")
+
+
+class ItemStyle:
+    """รูปแบบของร้านหนึ่งร้านในรายการ template ใช้กับ text message ส่วน columns ใช้กับ Flex"""
+
+    __slots__ = ("template", "columns")
+
+    def __init__(self, template, columns=()):
+        self.template = template
+        self.columns = columns
+
+
+# block ของแต่ละร้าน (detail_block, recommend_block, ...) render ไว้แล้วใน StoreRecord ตอนโหลดข้อมูล
+STYLES = {
+    "names": ItemStyle("ร้านที่ {number} : {record.name}\n"),
+    "details": ItemStyle("{record.detail_block}", ("ที่อยู่", "เวลาทำการ", "ช่องทางติดต่อ")),
+    "recommend": ItemStyle(
+        "ร้านที่ : {number}\n{record.recommend_block}\n", ("ที่อยู่", "เวลาทำการ", "ช่องทางติดต่อ")
+    ),
+    "recommend_no_contact": ItemStyle(
+        "ร้านที่ : {number}\n{record.recommend_block_no_contact}\n", ("ที่อยู่", "เวลาทำการ")
+    ),
+    "nearby": ItemStyle("ร้านที่ {number} : {record.name} ({note})\n{record.map_line}\n", ("ที่อยู่",)),
+}
+
+
+def text_length(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _clip(text, limit):
+    # ร้านเดียวที่ยาวเกิน message หนึ่งอัน (แทบไม่เกิดขึ้น) ตัดท้ายทิ้ง
+    if text_length(text) <= limit:
+        return text
+    text = text[: max(0, limit - 1)]
+    while text and text_length(text) > limit - 1:
+        text = text[:-1]
+    return text + "…"
+
+
+def is_more(text):
+    return text.strip().lower() in MORE_WORDS
+
+
+class Listing:
+    """คำตอบที่เป็นรายการร้าน: หัวข้อ, ร้านตามลำดับ (ตำแหน่งใน catalogue) และข้อความท้าย
+
+    notes คือข้อความเพิ่มของแต่ละร้าน (เช่นระยะทาง) เรียงตาม rows
+    """
+
+    __slots__ = ("style", "rows", "header", "footer", "notes", "page")
+
+    def __init__(self, style, rows, header="", footer="", notes=None, page=1):
+        self.style = style
+        self.rows = list(rows)
+        self.header = header
+        self.footer = footer
+        self.notes = list(notes) if notes is not None else None
+        self.page = page
+
+    def __len__(self):
+        return len(self.rows)
+
+    def item(self, records, i):
+        note = self.notes[i] if self.notes is not None else ""
+        return STYLES[self.style].template.format(
+            number=i + 1, record=records[self.rows[i]], note=note
+        )
+
+    def cursor(self, start, version=""):
+        # เก็บใน session (ต้องแปลงเป็น JSON ได้) เพื่อตอบหน้าถัดไปเมื่อผู้ใช้พิมพ์ "ต่อ"
+        # version คือ StoreCatalogue.version ของข้อมูลที่ rows อ้างถึง
+        return {
+            "version": version,
+            "style": self.style,
+            "rows": self.rows,
+            "notes": self.notes,
+            "footer": self.footer,
+            "start": start,
+            "page": self.page + 1,
+        }
+
+    @classmethod
+    def from_cursor(cls, cursor, records, version=""):
+        rows = cursor["rows"]
+        # หลัง reload ตำแหน่งเดิมอาจชี้ไปที่ร้านอื่น จึงใช้ cursor ได้เฉพาะกับข้อมูลชุดเดียวกัน
+        if cursor.get("version", "") != version or cursor["style"] not in STYLES:
+            return None, 0
+        if any(row >= len(records) for row in rows):
+            return None, 0
+        listing = cls(
+            cursor["style"],
+            rows,
+            header=f"📄 หน้า {cursor['page']}\n\n",
+            footer=cursor["footer"],
+            notes=cursor.get("notes"),
+            page=cursor["page"],
+        )
+        return listing, cursor["start"]
+
+
+def message_bytes(message):
+    # ขนาด JSON ของ message ตามที่ส่งไปใน request body
+    if not isinstance(message, dict):
+        message = {"type": "text", "text": message}
+    return len(json.dumps(message, ensure_ascii=False).encode("utf-8"))
+
+
+class Page:
+    """message ของหน้าหนึ่ง (str คือ text message, dict คือ Flex message) และตำแหน่งเริ่มของหน้าถัดไป"""
+
+    __slots__ = ("messages", "next_start", "payload_bytes")
+
+    def __init__(self, messages, next_start):
+        self.messages = messages
+        self.next_start = next_start
+        self.payload_bytes = sum(message_bytes(message) for message in messages)
+
+
+def more_hint(remaining):
+    return f"\n👉 พิมพ์ \"ต่อ\" เพื่อดูร้านถัดไป (เหลืออีก {remaining} ร้าน)"
+
+
+def paginate(listing, records, start=0, output="text", max_items=0):
+    """หน้าหนึ่งของรายการเริ่มจากร้านลำดับที่ start ไม่เกิน MAX_MESSAGES message ต่อ reply"""
+    if output == "flex":
+        return _flex_page(listing, records, start, max_items)
+    return _text_page(listing, records, start, max_items)
+
+
+def _text_page(listing, records, start, max_items):
+    # เผื่อที่ท้าย message สุดท้ายไว้สำหรับข้อความท้ายหรือคำแนะนำให้พิมพ์ "ต่อ"
+    reserve = max(text_length(listing.footer), text_length(more_hint(len(listing))))
+    messages = []
+    parts = [listing.header]
+    length = text_length(listing.header)
+    i = start
+    while i < len(listing) and not (max_items and i - start >= max_items):
+        item = listing.item(records, i)
+        item_length = text_length(item)
+        last = len(messages) == MAX_MESSAGES - 1
+        limit = MAX_TEXT_LENGTH - (reserve if last else 0)
+        if length + item_length <= limit:
+            parts.append(item)
+            length += item_length
+            i += 1
+        elif length:
+            if last:
+                break
+            messages.append("".join(parts))
+            parts, length = [], 0
+        else:
+            parts, length = [_clip(item, limit)], limit
+            i += 1
+    current = "".join(parts)
+    next_start = i if i < len(listing) else None
+    tail = listing.footer if next_start is None else more_hint(len(listing) - i)
+    if length + text_length(tail) <= MAX_TEXT_LENGTH:
+        current += tail
+    else:
+        messages.append(current)
+        current = tail.lstrip("\n")
+    messages.append(current)
+    return Page([message for message in messages if message], next_start)
+
+
+def _bubble(listing, records, i):
+    record = records[listing.rows[i]]
+    contents = [
+        {"type": "text", "text": f"{i + 1}. {record.name}", "weight": "bold", "size": "sm", "wrap": True}
+    ]
+    if listing.notes is not None and listing.notes[i]:
+        contents.append({"type": "text", "text": listing.notes[i], "size": "xs", "color": "#888888"})
+    for column in STYLES[listing.style].columns:
+        value = record.fields.get(column, "")
+        if value and value != MISSING_VALUE:
+            contents.append({"type": "text", "text": f"{column} : {value}", "size": "xs", "wrap": True})
+    bubble = {
+        "type": "bubble",
+        "size": "kilo",
+        "body": {"type": "box", "layout": "vertical", "spacing": "sm", "contents": contents},
+    }
+    map_url = record.fields.get(MAP_COLUMN, "")
+    if map_url.startswith(("http://", "https://")):
+        bubble["footer"] = {
+            "type": "box",
+            "layout": "vertical",
+            "contents": [
+                {
+                    "type": "button",
+                    "style": "link",
+                    "height": "sm",
+                    "action": {"type": "uri", "label": "แผนที่", "uri": map_url},
+                }
+            ],
+        }
+    return bubble
+
+
+def _flex_page(listing, records, start, max_items):
+    # หัวข้อ, carousel หนึ่งอัน และข้อความท้ายหรือคำแนะนำให้พิมพ์ "ต่อ" รวมไม่เกิน 3 message
+    limit = min(MAX_BUBBLES, max_items or MAX_BUBBLES)
+    bubbles = []
+    size = 0
+    i = start
+    while i < len(listing) and len(bubbles) < limit:
+        bubble = _bubble(listing, records, i)
+        bubble_size = len(json.dumps(bubble, ensure_ascii=False).encode("utf-8")) + 1
+        if bubbles and size + bubble_size > MAX_CAROUSEL_BYTES - 1000:
+            break
+        bubbles.append(bubble)
+        size += bubble_size
+        i += 1
+    next_start = i if i < len(listing) else None
+    alt_text = _clip(listing.header.strip() or "รายชื่อร้าน", MAX_ALT_TEXT_LENGTH)
+    messages = [_clip(listing.header.strip(), MAX_TEXT_LENGTH)] if listing.header.strip() else []
+    if bubbles:
+        messages.append(
+            {"type": "flex", "altText": alt_text, "contents": {"type": "carousel", "contents": bubbles}}
+        )
+    tail = listing.footer if next_start is None else more_hint(len(listing) - i)
+    if tail.strip():
+        messages.append(_clip(tail.strip(), MAX_TEXT_LENGTH))
+    return Page(messages, next_start)
@@ -0,0 +1,121 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# ค่าพิเศษสำหรับบอก worker ให้หยุดทำงาน
+_STOP = object()
+
+
+class ReplyWorkerPool:
+    """คิวงานขนาดจำกัดพร้อม worker thread ที่ดึงงานเป็นชุด (micro-batch) ไปประมวลผล
+
+    handle_batch จะถูกเรียกด้วย list ของงานที่ดึงได้ในรอบนั้น
+    """
+
+    def __init__(self, handle_batch, workers=2, max_queue=1000, max_batch=16, batch_wait=0.01):
+        self.handle_batch = handle_batch
+        self.workers = workers
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.accepted = 0
+        self.shed = 0
+        self.failed_batches = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._submit_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._pid = None
+
+    def start(self):
+        # เริ่ม worker thread ครั้งเดียวต่อ process เรียกซ้ำได้
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # process ลูกหลัง fork: thread ของ process แม่ไม่ได้ติดมา และงานในคิวเป็นของ process แม่
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"reply-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+
+    def submit(self, items):
+        # รับทั้งชุดหรือไม่รับเลย เพื่อไม่ให้ LINE ส่งซ้ำ event ที่ตอบไปแล้วบางส่วน
+        items = list(items)
+        # WSGI server ที่ไม่ได้เรียก main.start_background (เช่น flask run หรือ gunicorn ที่ไม่ใช้
+        # gunicorn.conf.py) จะเริ่ม worker ตอนมีงานแรก ไม่งั้นงานจะค้างในคิวโดยไม่มีใครส่ง
+        if not self._closed:
+            self.start()
+        with self._submit_lock:
+            if self._closed or self._queue.qsize() + len(items) > self._queue.maxsize:
+                self.shed += len(items)
+                return False
+            for item in items:
+                self._queue.put_nowait(item)
+            self.accepted += len(items)
+        return True
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.depth(),
+            "accepted": self.accepted,
+            "shed": self.shed,
+            "failed_batches": self.failed_batches,
+            "workers": len(self._threads),
+        }
+
+    def shutdown(self, timeout=30.0):
+        # หยุดรับงานใหม่ แล้วรอให้ worker ทำงานที่ค้างในคิวให้หมดก่อนปิด
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # ส่งต่อให้ตัวเองหยุดในรอบถัดไปหลังทำชุดนี้เสร็จ
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self.handle_batch(batch)
+            except Exception:
+                self.failed_batches += 1
+                log.exception("❌ Worker error", extra={"batch_size": len(batch)})
@@ -0,0 +1,392 @@
+"""ดึงข้อมูลร้านจากบทความรีวิวมารวมเป็น data/hangout_info.csv
+
+ใช้ได้ทั้งแบบ import (run/parse_article/merge_stores) และผ่าน data/webScraping.py
+ต้องติดตั้ง requirements-scraper.txt (lxml ไม่บังคับ แต่ parse เร็วกว่า html.parser มาก)
+"""
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from bs4 import BeautifulSoup
+
+from catalogue import LAT_COLUMN, LON_COLUMN, MAP_COLUMN
+from geo import parse_coordinates
+
+log = logging.getLogger(__name__)
+
+DATA_PATH = "data/hangout_info.csv"
+CACHE_DIR = "data/html_cache"
+FIXTURES_DIR = "data/fixtures"
+SOURCES = ["https://food.trueid.net/detail/2Q6J46VdqKAQ"]
+
+COLUMNS = [
+    "อันดับ",
+    "ชื่อร้าน",
+    "พิกัด",
+    "ที่อยู่",
+    "เวลาทำการ",
+    "ช่องทางติดต่อ",
+    "ที่จอดรถ",
+    "เว็บไซต์",
+    "เปิดหลังเที่ยงคืน",
+    "มีที่จอดรถ",
+]
+# คอลัมน์พิกัดที่ได้จากการเปิดลิงก์แผนที่ (--resolve-maps) จะเพิ่มเข้า CSV เมื่อมีค่าแล้วเท่านั้น
+GEO_COLUMNS = [LAT_COLUMN, LON_COLUMN]
+DEFAULT_VALUE = "ไม่มี"
+UNKNOWN = "ไม่ทราบ"
+
+# หัวข้อของแต่ละบรรทัดในรายละเอียดร้าน -> (คอลัมน์, เอาค่าจากลิงก์หรือไม่)
+FIELD_PREFIXES = (
+    ("พิกัด", "พิกัด", True),
+    ("ที่อยู่", "ที่อยู่", False),
+    ("เปิดบริการ", "เวลาทำการ", False),
+    ("โทร", "ช่องทางติดต่อ", False),
+    ("ที่จอดรถ", "ที่จอดรถ", False),
+    ("เว็บไซต์", "เว็บไซต์", True),
+)
+
+try:
+    import lxml  # noqa: F401
+
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+_RANK_PREFIX = re.compile(r"^\s*\d+\s*[.)]?\s*")
+_HOURS = re.compile(r"(\d{1,2})[.:](\d{2})\s*[-–]\s*(\d{1,2})[.:](\d{2})")
+_PARKING = re.compile(r"(ไม่มี|มี)")
+
+
+def late_night_flag(opening_hours):
+    """"ใช่" ถ้าร้านปิดหลังเที่ยงคืน เช่น "18.00 - 01.00 น." """
+    match = _HOURS.search(opening_hours or "")
+    if not match:
+        return UNKNOWN
+    open_hour, open_minute, close_hour, close_minute = map(int, match.groups())
+    opens = open_hour * 60 + open_minute
+    closes = close_hour * 60 + close_minute
+    # ปิดเวลาน้อยกว่าเวลาเปิด (ข้ามวัน) หรือเขียนเป็น 25.00 แปลว่าเลยเที่ยงคืน
+    if closes > 24 * 60 or (0 < closes < opens):
+        return "ใช่"
+    return "ไม่ใช่"
+
+
+def parking_flag(parking):
+    match = _PARKING.search(parking or "")
+    if not match:
+        return UNKNOWN
+    return "ไม่ใช่" if match.group() == "ไม่มี" else "ใช่"
+
+
+def _field_value(li, text, use_link):
+    if use_link:
+        link = li.find("a")
+        if link is not None and link.get("href"):
+            return link["href"]
+    _, _, value = text.partition(":")
+    return value.strip() or DEFAULT_VALUE
+
+
+def parse_article(html):
+    """แยกร้านจากหน้าบทความ: ชื่อร้านอยู่ใน h3 กลางหน้า รายละเอียดอยู่ใน ul ถัดไปตามลำดับ"""
+    soup = BeautifulSoup(html, PARSER)
+    names = []
+    for heading in soup.find_all("h3", style="text-align:center"):
+        name = _RANK_PREFIX.sub("", heading.get_text(" ", strip=True))
+        if len(name) > 1:
+            names.append(name)
+
+    details = []
+    for ul in soup.find_all("ul"):
+        fields = {}
+        for li in ul.find_all("li"):
+            text = li.get_text(strip=True)
+            for prefix, column, use_link in FIELD_PREFIXES:
+                if text.startswith(prefix):
+                    fields[column] = _field_value(li, text, use_link)
+                    break
+        # ul อื่นในหน้า (เมนู, แท็ก) ไม่มีหัวข้อเหล่านี้
+        if "ที่อยู่" in fields or "พิกัด" in fields:
+            details.append(fields)
+
+    if len(names) != len(details):
+        log.warning(
+            "⚠️  จำนวนชื่อร้านกับรายละเอียดไม่เท่ากัน",
+            extra={"names": len(names), "details": len(details)},
+        )
+    stores = []
+    for rank, (name, fields) in enumerate(zip(names, details), start=1):
+        row = {column: fields.get(column, DEFAULT_VALUE) for column in COLUMNS}
+        row["อันดับ"] = str(rank)
+        row["ชื่อร้าน"] = name
+        row["เปิดหลังเที่ยงคืน"] = late_night_flag(row["เวลาทำการ"])
+        row["มีที่จอดรถ"] = parking_flag(row["ที่จอดรถ"])
+        stores.append(row)
+    return stores
+
+
+class HostRateLimiter:
+    """เว้นระยะ request ไปยัง host เดียวกันอย่างน้อย min_interval วินาที"""
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class HtmlCache:
+    """เก็บ HTML ดิบและ ETag/Last-Modified ของแต่ละ URL ไว้บนดิสก์"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _paths(self, url):
+        base = os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+        return base + ".html", base + ".json"
+
+    def get(self, url):
+        html_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(html_path, "rb") as f:
+                return f.read(), meta
+        except (OSError, ValueError):
+            return None, {}
+
+    def put(self, url, content, headers):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        html_path, meta_path = self._paths(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        _atomic_write(html_path, content)
+        _atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+
+class Fetcher:
+    """ดึงหลาย URL พร้อมกันแบบ conditional GET โดยเว้นระยะตาม host"""
+
+    def __init__(self, cache=None, workers=8, min_interval=1.0, timeout=15.0):
+        self.cache = cache or HtmlCache()
+        self.workers = workers
+        self.timeout = timeout
+        self.limiter = HostRateLimiter(min_interval)
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session ไม่ควรใช้ข้าม thread แยกหนึ่ง session (และ keep-alive pool) ต่อ thread
+        session = getattr(self._local, "session", None)
+        if session is None:
+            import requests
+
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = "hangout-line-chat-bot scraper"
+        return session
+
+    def fetch(self, url):
+        """คืนค่า (html, status) status เป็น fetched, not_modified, cached หรือ failed"""
+        cached, meta = self.cache.get(url)
+        headers = {}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        self.limiter.wait(url)
+        try:
+            response = self._session().get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304 and cached is not None:
+                return cached, "not_modified"
+            response.raise_for_status()
+        except Exception as e:
+            if cached is not None:
+                log.warning("⚠️  ดึงหน้าไม่สำเร็จ ใช้ข้อมูลใน cache", extra={"url": url, "error": repr(e)})
+                return cached, "cached"
+            log.error("❌ ดึงหน้าไม่สำเร็จ", extra={"url": url, "error": repr(e)})
+            return None, "failed"
+        self.cache.put(url, response.content, response.headers)
+        return response.content, "fetched"
+
+    def fetch_all(self, urls):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(urls, pool.map(self.fetch, urls)))
+
+    def resolve_map_link(self, url):
+        """เปิดลิงก์แผนที่แบบย่อ (goo.gl/maps, g.page) ตาม redirect แล้วหาพิกัดจาก URL ปลายทางหรือในหน้า"""
+        self.limiter.wait(url)
+        try:
+            response = self._session().get(url, timeout=self.timeout, allow_redirects=True)
+        except Exception as e:
+            log.warning("⚠️  เปิดลิงก์แผนที่ไม่สำเร็จ", extra={"url": url, "error": repr(e)})
+            return None
+        for candidate in [*(r.headers.get("Location", "") for r in response.history), response.url]:
+            coordinates = parse_coordinates(unquote(candidate))
+            if coordinates:
+                return coordinates
+        return parse_coordinates(unquote(response.text))
+
+    def resolve_all(self, urls):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return dict(zip(urls, pool.map(self.resolve_map_link, urls)))
+
+
+class FixtureFetcher:
+    """อ่าน HTML ที่บันทึกไว้แทนการดึงจากเว็บ (data/fixtures/sources.json บอกว่า URL ไหนใช้ไฟล์ไหน)"""
+
+    def __init__(self, fixtures_dir=FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        with open(os.path.join(fixtures_dir, "sources.json"), encoding="utf-8") as f:
+            self.files = json.load(f)
+
+    def fetch(self, url):
+        name = self.files.get(url)
+        if name is None:
+            return None, "failed"
+        with open(os.path.join(self.fixtures_dir, name), "rb") as f:
+            return f.read(), "fixture"
+
+    def fetch_all(self, urls):
+        return {url: self.fetch(url) for url in urls}
+
+
+def store_key(name):
+    return re.sub(r"\s+", " ", name).strip().casefold()
+
+
+def merge_stores(existing, scraped):
+    """รวมร้านที่ดึงมาใหม่เข้ากับข้อมูลเดิมตามชื่อร้าน คืนค่า (rows, จำนวนที่เพิ่ม, จำนวนที่แก้)
+
+    ร้านเดิมคงอันดับไว้ ร้านใหม่ต่อท้าย ค่า "ไม่มี" จากหน้าเว็บไม่ทับค่าที่มีอยู่แล้ว
+    """
+    rows = [dict(row) for row in existing]
+    by_key = {store_key(row["ชื่อร้าน"]): row for row in rows}
+    next_rank = max((int(row["อันดับ"]) for row in rows if row.get("อันดับ", "").isdigit()), default=0)
+    added = updated = 0
+    for store in scraped:
+        row = by_key.get(store_key(store["ชื่อร้าน"]))
+        if row is None:
+            next_rank += 1
+            row = dict(store, อันดับ=str(next_rank))
+            rows.append(row)
+            by_key[store_key(row["ชื่อร้าน"])] = row
+            added += 1
+            continue
+        changed = False
+        for column in COLUMNS:
+            if column in ("อันดับ", "ชื่อร้าน"):
+                continue
+            value = store.get(column)
+            if value in (None, "", DEFAULT_VALUE, UNKNOWN) or value == row.get(column):
+                continue
+            row[column] = value
+            if column == MAP_COLUMN:
+                # ลิงก์แผนที่เปลี่ยน พิกัดเดิมอาจไม่ใช่ของร้านนี้แล้ว ให้ --resolve-maps เปิดลิงก์ใหม่
+                for geo_column in GEO_COLUMNS:
+                    row.pop(geo_column, None)
+            changed = True
+        updated += changed
+    return rows, added, updated
+
+
+def _atomic_write(path, content):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def read_csv(path):
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            return list(reader.fieldnames or COLUMNS), [dict(row) for row in reader]
+    except FileNotFoundError:
+        return list(COLUMNS), []
+
+
+def write_csv(path, columns, rows):
+    # เขียนไฟล์ชั่วคราวแล้ว os.replace ตัว reloader จะไม่เห็นไฟล์ที่เขียนไม่เสร็จ
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=columns, extrasaction="ignore", lineterminator="\n"
+        )
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def resolve_coordinates(rows, fetcher):
+    """เติมละติจูด/ลองจิจูดให้ร้านที่ยังไม่มี คืนค่าจำนวนร้านที่ได้พิกัด"""
+    pending = {}
+    for row in rows:
+        link = row.get(MAP_COLUMN, "")
+        if row.get(LAT_COLUMN) or not link.startswith("http"):
+            continue
+        pending.setdefault(link, []).append(row)
+    resolved = 0
+    for link, coordinates in fetcher.resolve_all(list(pending)).items():
+        if coordinates is None:
+            continue
+        for row in pending[link]:
+            row[LAT_COLUMN], row[LON_COLUMN] = (f"{value:.6f}" for value in coordinates)
+            resolved += 1
+    return resolved
+
+
+def run(urls=None, out_path=DATA_PATH, fetcher=None, resolve_maps=False):
+    """ดึงทุกแหล่ง แยกร้าน แล้วรวมเข้ากับ out_path คืนค่ารายงานผล"""
+    started = time.perf_counter()
+    urls = list(urls or SOURCES)
+    fetcher = fetcher or Fetcher()
+    pages = fetcher.fetch_all(urls)
+
+    statuses = {}
+    scraped = []
+    for url in urls:
+        html, status = pages[url]
+        statuses[status] = statuses.get(status, 0) + 1
+        if html is not None:
+            scraped.extend(parse_article(html))
+
+    columns, existing = read_csv(out_path)
+    rows, added, updated = merge_stores(existing, scraped)
+    located = resolve_coordinates(rows, fetcher) if resolve_maps else 0
+    columns += [
+        column
+        for column in GEO_COLUMNS
+        if column not in columns and any(row.get(column) for row in rows)
+    ]
+    if added or updated or located or not os.path.exists(out_path):
+        write_csv(out_path, columns, rows)
+    return {
+        "sources": len(urls),
+        "pages": statuses,
+        "stores_scraped": len(scraped),
+        "added": added,
+        "updated": updated,
+        "located": located,
+        "total": len(rows),
+        "duration": round(time.perf_counter() - started, 3),
+    }
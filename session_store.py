@@ -0,0 +1,199 @@
+import json
+from abc import ABC, abstractmethod
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# บทสนทนาที่ไม่มีความเคลื่อนไหวเกินเวลานี้ (วินาที) จะถูกลบทิ้ง
+DEFAULT_TTL = 15 * 60
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_DB_PATH = "data/sessions.sqlite3"
+
+
+class Session:
+    __slots__ = ("key", "answers", "cursor", "updated_at")
+
+    def __init__(self, key, answers=None, cursor=None, updated_at=0.0):
+        self.key = key
+        # คำตอบ ใช่/ไม่ใช่ ของคำถามแนะนำร้านทั้ง 3 ข้อ
+        self.answers = answers if answers is not None else []
+        # หน้าถัดไปของรายการร้านล่าสุด (reply_pages.Listing.cursor) ใช้ตอบเมื่อผู้ใช้พิมพ์ "ต่อ"
+        self.cursor = cursor
+        self.updated_at = updated_at
+
+    def to_dict(self):
+        return {"answers": self.answers, "cursor": self.cursor}
+
+    @classmethod
+    def from_dict(cls, key, data, updated_at=0.0):
+        return cls(
+            key,
+            answers=list(data.get("answers", [])),
+            cursor=data.get("cursor"),
+            updated_at=updated_at,
+        )
+
+
+class SessionStore(ABC):
+    """ที่เก็บสถานะบทสนทนาแยกตามผู้ใช้ (key คือ userId/groupId จาก LINE)"""
+
+    @abstractmethod
+    def get(self, key):
+        """session ของ key หรือ session ใหม่ถ้ายังไม่มีหรือหมดอายุแล้ว"""
+
+    @abstractmethod
+    def save(self, session):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def stats(self):
+        """dict ของ live_sessions และ evictions"""
+
+
+class MemorySessionStore(SessionStore):
+    """LRU ในหน่วยความจำ มี TTL และจำกัดจำนวน session สูงสุด ใช้ได้ใน process เดียว"""
+
+    def __init__(self, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and now - session.updated_at > self.ttl:
+                del self._sessions[key]
+                self.evictions += 1
+                session = None
+            if session is None:
+                return Session(key, updated_at=now)
+            self._sessions.move_to_end(key)
+            return session
+
+    def save(self, session):
+        now = time.monotonic()
+        session.updated_at = now
+        with self._lock:
+            self._sessions[session.key] = session
+            self._sessions.move_to_end(session.key)
+            self._evict(now)
+
+    def delete(self, key):
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def _evict(self, now):
+        # ตัวที่อยู่หน้าสุดคือตัวที่ไม่ได้ใช้นานที่สุด
+        while self._sessions:
+            key, oldest = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - oldest.updated_at > self.ttl:
+                del self._sessions[key]
+                self.evictions += 1
+            else:
+                break
+
+    def stats(self):
+        with self._lock:
+            return {"live_sessions": len(self._sessions), "evictions": self.evictions}
+
+
+class SQLiteSessionStore(SessionStore):
+    """เก็บ session ลงไฟล์ SQLite เพื่อให้หลาย worker process ใช้สถานะร่วมกันได้"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.evictions = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # เปิด connection ตอนใช้ครั้งแรก ไม่ใช่ตอนสร้าง
+        # (gunicorn สร้าง store ใน process แม่ก่อน fork ซึ่ง connection ใช้ข้าม fork ไม่ได้)
+        self._pid = None
+
+    def _conn(self):
+        # sqlite3 connection ใช้ข้าม thread และข้าม process ไม่ได้ จึงเปิดแยกต่อ thread ในแต่ละ process
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._local = threading.local()
+                    self._pid = os.getpid()
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS sessions ("
+                    " key TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)"
+                )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        # ใช้ wall clock เพราะหลาย process ต้องเทียบเวลากันได้
+        now = time.time()
+        row = self._conn().execute(
+            "SELECT data, updated_at FROM sessions WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            return Session(key, updated_at=now)
+        return Session.from_dict(key, json.loads(row[0]), updated_at=row[1])
+
+    def save(self, session):
+        now = time.time()
+        session.updated_at = now
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (key, data, updated_at) VALUES (?, ?, ?)",
+                (session.key, json.dumps(session.to_dict(), ensure_ascii=False), now),
+            )
+            evicted = conn.execute(
+                "DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl,)
+            ).rowcount
+            evicted += conn.execute(
+                "DELETE FROM sessions WHERE key IN ("
+                " SELECT key FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,),
+            ).rowcount
+        if evicted > 0:
+            with self._lock:
+                self.evictions += evicted
+
+    def delete(self, key):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def stats(self):
+        live = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
+        # evictions นับเฉพาะที่ process นี้เป็นคนลบ
+        return {"live_sessions": live, "evictions": self.evictions}
+
+
+def create_store():
+    backend = os.getenv("SESSION_BACKEND", "memory")
+    ttl = float(os.getenv("SESSION_TTL", DEFAULT_TTL))
+    max_sessions = int(os.getenv("SESSION_MAX", DEFAULT_MAX_SESSIONS))
+    if backend == "sqlite":
+        path = os.getenv("SESSION_DB", DEFAULT_DB_PATH)
+        return SQLiteSessionStore(path, ttl=ttl, max_sessions=max_sessions)
+    if backend != "memory":
+        raise ValueError(f"ไม่รู้จัก SESSION_BACKEND: {backend}")
+    return MemorySessionStore(ttl=ttl, max_sessions=max_sessions)
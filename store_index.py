@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import string
+
+import numpy as np
+
+import intent_index
+from intent_cache import normalize_utterance
+
+log = logging.getLogger(__name__)
+
+INDEX_NAME = "store_index"
+# คะแนนขั้นต่ำที่เลือกจากชุดข้อความทดสอบ (tools/store_search_eval.py --write) แยกตามโมเดล
+THRESHOLD_PATH = "data/store_search_threshold.json"
+# exact คูณเมทริกซ์ทั้งก้อน, ivf ค้นเฉพาะบางกลุ่ม (ผลโดยประมาณ), auto ใช้ ivf เมื่อร้านมีตั้งแต่ IVF_MIN_ROWS
+SEARCH_MODES = ("exact", "ivf", "auto")
+IVF_MIN_ROWS = 10000
+# k-means ฝึกจากตัวอย่างไม่เกินกลุ่มละเท่านี้แถว แล้วค่อยจัดทุกแถวเข้ากลุ่ม
+TRAIN_ROWS_PER_LIST = 256
+
+_NAME_NOISE = str.maketrans("", "", string.punctuation + " ")
+
+
+def name_key(text):
+    # เทียบชื่อร้านโดยไม่สนช่องว่างและเครื่องหมาย เช่น "ฟัง pls" กับ "ฟัง pls."
+    return normalize_utterance(text).translate(_NAME_NOISE)
+
+
+def spherical_kmeans(matrix, nlist, iterations=10, seed=0):
+    """k-means บนเวกเตอร์ที่ normalize แล้ว (วัดด้วย cosine) คืนค่า centroid ที่ normalize แล้ว"""
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        counts = np.bincount(assign, minlength=nlist)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.empty_like(centroids)
+        sums[filled] = np.add.reduceat(matrix[order], starts[filled], axis=0)
+        # กลุ่มที่ว่างสุ่มจุดเริ่มใหม่
+        sums[~filled] = matrix[rng.choice(len(matrix), int((~filled).sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = (sums / np.maximum(norms, 1e-12)).astype(np.float32)
+    return centroids
+
+
+class IvfIndex:
+    """inverted file: แถวของกลุ่ม c อยู่ใน order[offsets[c]:offsets[c + 1]]"""
+
+    def __init__(self, centroids, order, offsets, key=""):
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.key = key
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, matrix, nlist=None, iterations=10, seed=0, key=""):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        nlist = min(len(matrix), nlist or max(1, int(np.sqrt(len(matrix)))))
+        rng = np.random.default_rng(seed)
+        sample = matrix
+        if len(matrix) > nlist * TRAIN_ROWS_PER_LIST:
+            sample = matrix[np.sort(rng.choice(len(matrix), nlist * TRAIN_ROWS_PER_LIST, replace=False))]
+        centroids = spherical_kmeans(sample, nlist, iterations, seed)
+        assign = np.argmax(matrix @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))])
+        return cls(centroids, order, offsets, key=key)
+
+    def probe(self, vector, nprobe):
+        """แถวทั้งหมดใน nprobe กลุ่มที่ centroid ใกล้ vector ที่สุด"""
+        nearest = _top_k(self.centroids @ vector, nprobe)
+        return np.concatenate([self.order[self.offsets[c] : self.offsets[c + 1]] for c in nearest])
+
+
+def _top_k(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class StoreSearch:
+    """ค้นหาร้านจาก embedding ของข้อความร้าน (ชื่อ ที่อยู่ เวลาทำการ และคำอธิบาย)
+
+    index คือ IntentIndex ที่ phrases เป็นข้อความของร้านและ labels เป็นชื่อร้าน แถวที่ i คือร้านลำดับที่ i
+    """
+
+    def __init__(self, index, ivf=None, nprobe=16):
+        self.index = index
+        self.ivf = ivf
+        self.nprobe = nprobe
+        self._names = {}
+        for row, name in enumerate(index.labels.tolist()):
+            self._names.setdefault(name_key(str(name)), row)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def mode(self):
+        return "exact" if self.ivf is None else "ivf"
+
+    def find_name(self, text):
+        """แถวของร้านที่ชื่อตรงกับข้อความหรือ None"""
+        return self._names.get(name_key(text))
+
+    def search(self, vectors, k=3):
+        """คืนค่า list ของ [(แถว, คะแนน), ...] ต่อหนึ่งคำถาม เรียงจากคะแนนมากไปน้อย"""
+        vectors = np.atleast_2d(vectors)
+        if not len(self) or k <= 0:
+            return [[] for _ in vectors]
+        matrix = self.index.matrix
+        if self.ivf is None:
+            # ร้านไม่มากคูณเมทริกซ์ครั้งเดียวได้คะแนนของทุกคำถามกับทุกร้าน
+            scores = vectors @ matrix.T
+            k = min(k, scores.shape[1])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            top_scores = np.take_along_axis(top_scores, order, axis=1)
+            return [
+                list(zip(rows.tolist(), row_scores.tolist()))
+                for rows, row_scores in zip(top, top_scores)
+            ]
+        results = []
+        for vector in vectors:
+            rows = self.ivf.probe(vector, self.nprobe)
+            scores = matrix[rows] @ vector
+            top = _top_k(scores, k)
+            results.append(list(zip(rows[top].tolist(), scores[top].tolist())))
+        return results
+
+
+def load_threshold(model_name, path=THRESHOLD_PATH):
+    """คะแนนขั้นต่ำที่ปรับเทียบไว้กับโมเดลนี้ หรือ None ถ้ายังไม่เคยปรับเทียบ"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            calibrated = json.load(f)
+    except (OSError, ValueError):
+        return None
+    entry = calibrated.get(model_name)
+    return float(entry["threshold"]) if entry else None
+
+
+def save_threshold(model_name, entry, path=THRESHOLD_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            calibrated = json.load(f)
+    except (OSError, ValueError):
+        calibrated = {}
+    calibrated[model_name] = entry
+    intent_index._atomic_write(
+        path,
+        lambda f: f.write(
+            (json.dumps(calibrated, ensure_ascii=False, indent=1, sort_keys=True) + "\n").encode("utf-8")
+        ),
+    )
+
+
+def use_ivf(mode, rows):
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"STORE_SEARCH_MODE ต้องเป็นหนึ่งใน {', '.join(SEARCH_MODES)}")
+    return mode == "ivf" or (mode == "auto" and rows >= IVF_MIN_ROWS)
+
+
+def _ivf_path(index_dir, name):
+    return os.path.join(index_dir, name + ".ivf.npz")
+
+
+def save_ivf(ivf, index_dir=intent_index.INDEX_DIR, name=INDEX_NAME):
+    intent_index._atomic_write(
+        _ivf_path(index_dir, name),
+        lambda f: np.savez(
+            f, centroids=ivf.centroids, order=ivf.order, offsets=ivf.offsets, key=np.array(ivf.key)
+        ),
+    )
+
+
+def load_ivf(key, index_dir=intent_index.INDEX_DIR, name=INDEX_NAME):
+    try:
+        with np.load(_ivf_path(index_dir, name)) as data:
+            if str(data["key"]) != key:
+                return None
+            return IvfIndex(data["centroids"], data["order"], data["offsets"], key=key)
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _build_ivf(index, index_dir, name):
+    ivf = load_ivf(index.key, index_dir=index_dir, name=name)
+    if ivf is not None:
+        return ivf
+    ivf = IvfIndex.build(index.matrix, key=index.key)
+    try:
+        save_ivf(ivf, index_dir=index_dir, name=name)
+    except OSError as e:
+        log.warning("⚠️  บันทึก IVF ของร้านไม่สำเร็จ", extra={"error": repr(e)})
+    return ivf
+
+
+def update_search(
+    previous,
+    model,
+    model_name,
+    texts,
+    names,
+    mode="auto",
+    nprobe=16,
+    index_dir=intent_index.INDEX_DIR,
+    name=INDEX_NAME,
+):
+    """สร้างหรือโหลด index ของร้าน encode เฉพาะร้านที่ข้อความเปลี่ยน คืนค่า (StoreSearch, จำนวนร้านที่ encode ใหม่)"""
+    if not texts:
+        empty = np.zeros((0, model.dim), np.float32)
+        return StoreSearch(intent_index.IntentIndex(empty, [], [])), 0
+    index, reembedded = intent_index.update_index(
+        previous.index if previous is not None else None,
+        model,
+        model_name,
+        texts,
+        names,
+        index_dir=index_dir,
+        name=name,
+    )
+    ivf = None
+    if use_ivf(mode, len(index)):
+        if previous is not None and previous.ivf is not None and previous.ivf.key == index.key:
+            ivf = previous.ivf
+        else:
+            ivf = _build_ivf(index, index_dir, name)
+    return StoreSearch(index, ivf, nprobe), reembedded
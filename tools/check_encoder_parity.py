@@ -0,0 +1,67 @@
+"""ตรวจว่า encoder backend ที่เลือกจัด intent ได้ตรงกับโมเดล fp32 เดิมทุกวลีใน data/intents.json
+
+รันจากโฟลเดอร์หลักของโปรเจกต์: python tools/check_encoder_parity.py --backend onnx
+วลีแต่ละวลีจะถูกเทียบกับ corpus ที่ตัดตัวเองออก (leave-one-out) เพราะถ้าไม่ตัด
+ทุก backend จะเจอตัวเองเป็นอันดับหนึ่งเสมอ เทียบกลุ่มของวลีที่ตรงแบบที่ใช้เลือกคำตอบ (แยก agree/disagree
+เพราะ "ต้องการ" กับ "ไม่ต้องการ" ให้คำตอบต่างกัน) ถ้าผลไม่ตรงกันจะจบด้วย exit code 1
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoder
+import intent_index
+from intents import INTENTS_PATH, IntentSet
+from logical import MODEL_NAME
+
+THRESHOLD = 0.6
+
+
+def top1_leave_one_out(model, phrases):
+    matrix = intent_index.encode_phrases(model, phrases)
+    scores = matrix @ matrix.T
+    # ตัดวลีตัวเองและวลีที่ซ้ำกันออก
+    same = np.array([[a == b for b in phrases] for a in phrases])
+    scores[same] = -np.inf
+    rows = np.argmax(scores, axis=1)
+    return rows, scores[np.arange(len(phrases)), rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ตรวจความตรงกันของ encoder backend")
+    parser.add_argument("--backend", required=True, choices=encoder.BACKENDS)
+    args = parser.parse_args()
+
+    intents = IntentSet.load(INTENTS_PATH)
+    phrases = intents.combined
+    labels = intents.fine_labels
+    reference = encoder.load_encoder(MODEL_NAME, backend="torch")
+    candidate = encoder.load_encoder(MODEL_NAME, backend=args.backend)
+
+    ref_rows, ref_scores = top1_leave_one_out(reference, phrases)
+    cand_rows, cand_scores = top1_leave_one_out(candidate, phrases)
+
+    mismatches = 0
+    for i, phrase in enumerate(phrases):
+        ref_label = labels[ref_rows[i]] if ref_scores[i] >= THRESHOLD else "fallback"
+        cand_label = labels[cand_rows[i]] if cand_scores[i] >= THRESHOLD else "fallback"
+        if ref_label != cand_label:
+            mismatches += 1
+            print(
+                f"❌ {phrase}: fp32={ref_label} ({ref_scores[i]:.3f})"
+                f" {args.backend}={cand_label} ({cand_scores[i]:.3f})"
+            )
+
+    # วัดว่า embedding ของ backend ที่เลือกเบี่ยงไปจาก fp32 มากแค่ไหน
+    ref_self = intent_index.encode_phrases(reference, phrases)
+    cand_self = intent_index.encode_phrases(candidate, phrases)
+    drift = float(np.max(np.abs(np.sum(ref_self * cand_self, axis=1) - 1.0)))
+
+    print(f"วลีทั้งหมด {len(phrases)} ไม่ตรงกัน {mismatches}")
+    print(f"cosine drift สูงสุดระหว่าง fp32 กับ {args.backend}: {drift:.4f}")
+    assert mismatches == 0, f"top-1 intent ของ {args.backend} ไม่ตรงกับ fp32 {mismatches} วลี"
+    print("✅ top-1 intent ตรงกับ fp32 ทุกวลี")
@@ -0,0 +1,25 @@
+"""สร้างไฟล์ ONNX ของ encoder จาก checkpoint เดียวกับที่ logical.py ใช้ (รันครั้งเดียว)
+
+รันจากโฟลเดอร์หลักของโปรเจกต์: python tools/export_onnx.py [--no-quantize]
+ต้องติดตั้ง onnx และ onnxruntime เพิ่ม ผลลัพธ์อยู่ที่ data/onnx/<model>/
+จากนั้นตั้ง ENCODER_BACKEND=onnx และตรวจด้วย tools/check_encoder_parity.py
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import encoder
+from logical import MODEL_NAME
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export encoder เป็น ONNX")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--out", default=None)
+    parser.add_argument(
+        "--no-quantize", action="store_true", help="ไม่สร้าง model.int8.onnx"
+    )
+    args = parser.parse_args()
+    out_dir = encoder.export_onnx(args.model, args.out, quantize=not args.no_quantize)
+    print(f"✅ บันทึก ONNX ที่ {out_dir}")
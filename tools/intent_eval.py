@@ -0,0 +1,125 @@
+"""วัดความแม่นของการจัด intent แบบสองขั้น (lexical ก่อน แล้วค่อยโมเดล) เทียบกับโมเดลอย่างเดียว
+
+รันจากโฟลเดอร์หลักของโปรเจกต์: python tools/intent_eval.py
+ใช้ชุดข้อความที่ติด label ไว้ใน data/intent_eval.csv (label none คือข้อความที่บอทควรตอบว่าไม่เข้าใจ)
+รายงานความแม่นของทั้งสองแบบ สัดส่วนข้อความที่ไม่ต้องผ่านโมเดล ความแม่นของขั้น lexical เมื่อมันตอบเอง
+ความแม่นของโมเดลบนข้อความที่ขั้น lexical ส่งต่อให้ และผลเมื่อปรับ threshold/margin ถ้าแบบสองขั้นแม่นน้อยกว่าโมเดลอย่างเดียวจะจบด้วย exit code 1
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intent_index
+from intent_lexical import LexicalMatcher
+from intents import INTENTS_PATH, IntentSet
+from logical import INTENT_THRESHOLD, LEXICAL_MARGIN, LEXICAL_THRESHOLD, get_model
+
+EVAL_PATH = "data/intent_eval.csv"
+NO_MATCH = "none"
+
+
+def load_eval(path):
+    with open(path, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [row["text"] for row in rows], [row["label"] for row in rows]
+
+
+def model_labels(model, intents, texts):
+    """label ที่โมเดลให้ต่อข้อความ และเวลา encode ต่อข้อความ (ทีละข้อความเหมือนตอนใช้งานจริง)"""
+    matrix = intent_index.encode_phrases(model, intents.combined)
+    labels, samples = [], []
+    for text in texts:
+        started = time.perf_counter()
+        vector = intent_index.encode_phrases(model, [text])[0]
+        scores = matrix @ vector
+        samples.append(time.perf_counter() - started)
+        row = int(np.argmax(scores))
+        labels.append(intents.fine_labels[row] if scores[row] >= INTENT_THRESHOLD else NO_MATCH)
+    return labels, samples
+
+
+def lexical_labels(matcher, texts):
+    """label ของขั้น lexical (None คือไม่มั่นใจ ส่งต่อให้โมเดล) และเวลาต่อข้อความ"""
+    labels, samples = [], []
+    for text in texts:
+        started = time.perf_counter()
+        hit = matcher.match(text)
+        samples.append(time.perf_counter() - started)
+        labels.append(matcher.labels[hit[0]] if hit is not None else None)
+    return labels, samples
+
+
+def evaluate(lexical, model, expected):
+    two_tier = [hit if hit is not None else fallback for hit, fallback in zip(lexical, model)]
+    answered = [(hit, want) for hit, want in zip(lexical, expected) if hit is not None]
+    handed_off = [(got, want) for hit, got, want in zip(lexical, model, expected) if hit is None]
+    return {
+        "accuracy": float(np.mean([got == want for got, want in zip(two_tier, expected)])),
+        "skip_fraction": len(answered) / len(expected),
+        "lexical_precision": (
+            float(np.mean([hit == want for hit, want in answered])) if answered else 1.0
+        ),
+        "handed_off": len(handed_off),
+        "handoff_accuracy": (
+            float(np.mean([got == want for got, want in handed_off])) if handed_off else 1.0
+        ),
+    }, two_tier
+
+
+def ms(samples):
+    return f"p50 {np.percentile(samples, 50) * 1000:.3f} ms / p95 {np.percentile(samples, 95) * 1000:.3f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="วัดความแม่นของการจัด intent แบบสองขั้น")
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("--threshold", type=float, default=LEXICAL_THRESHOLD)
+    parser.add_argument("--margin", type=float, default=LEXICAL_MARGIN)
+    args = parser.parse_args()
+
+    intents = IntentSet.load(INTENTS_PATH)
+    texts, expected = load_eval(args.eval)
+    matcher = LexicalMatcher(intents.combined, intents.fine_labels, args.threshold, args.margin)
+
+    model, model_samples = model_labels(get_model(), intents, texts)
+    lexical, lexical_samples = lexical_labels(matcher, texts)
+    model_accuracy = float(np.mean([got == want for got, want in zip(model, expected)]))
+    result, two_tier = evaluate(lexical, model, expected)
+
+    for text, want, hit, got in zip(texts, expected, lexical, two_tier):
+        if got != want:
+            tier = "lexical" if hit is not None else "model"
+            print(f"❌ {text}: ต้องเป็น {want} ได้ {got} ({tier})")
+
+    print(f"ข้อความทั้งหมด {len(texts)} threshold {args.threshold} margin {args.margin}")
+    print(f"ความแม่น โมเดลอย่างเดียว {model_accuracy:.3f} สองขั้น {result['accuracy']:.3f}")
+    print(
+        f"ไม่ต้องผ่านโมเดล {result['skip_fraction']:.1%}"
+        f" ความแม่นของขั้น lexical เมื่อตอบเอง {result['lexical_precision']:.3f}"
+    )
+    print(
+        f"ส่งต่อให้โมเดล {result['handed_off']} ข้อความ"
+        f" โมเดลแม่น {result['handoff_accuracy']:.3f}"
+    )
+    print(f"เวลาต่อข้อความ lexical {ms(lexical_samples)} โมเดล {ms(model_samples)}")
+
+    print("threshold margin  สองขั้น  ไม่ผ่านโมเดล  lexical แม่น")
+    for threshold in (0.5, 0.6, 0.7, 0.8, 0.9, 1.0):
+        for margin in (0.0, 0.1, 0.15, 0.25):
+            swept = LexicalMatcher(intents.combined, intents.fine_labels, threshold, margin)
+            row, _ = evaluate(lexical_labels(swept, texts)[0], model, expected)
+            print(
+                f"{threshold:9.2f} {margin:6.2f}  {row['accuracy']:7.3f}"
+                f"  {row['skip_fraction']:12.1%}  {row['lexical_precision']:11.3f}"
+            )
+
+    assert result["accuracy"] >= model_accuracy, (
+        f"แบบสองขั้นแม่นน้อยกว่าโมเดลอย่างเดียว ({result['accuracy']:.3f} < {model_accuracy:.3f})"
+    )
+    print("✅ ขั้น lexical ไม่ทำให้ความแม่นลดลง")
@@ -0,0 +1,102 @@
+"""เลือกคะแนนขั้นต่ำของการค้นหาร้านด้วยข้อความอิสระจากชุดข้อความทดสอบ
+
+รันจากโฟลเดอร์หลักของโปรเจกต์: python tools/store_search_eval.py --write
+data/store_search_eval.csv มีข้อความและชื่อร้านที่ควรได้ (หลายร้านคั่นด้วย |) แถวที่ไม่มีร้านคือข้อความที่บอทควรตอบว่าไม่เข้าใจ
+เช่นคำที่ไม่มีความหมาย วลีจัดอันดับ และเรื่องอื่น ข้อความที่มีร้านนับว่าถูกเมื่อร้านที่ตอบมีร้านที่ควรได้อย่างน้อยหนึ่งร้าน
+ข้อความที่ไม่มีร้านนับว่าถูกเมื่อไม่ได้ร้านเลย เลือก threshold ที่ถูกมากที่สุดโดยตอบร้านให้ข้อความที่ไม่มีร้าน
+ไม่เกิน --max-false-positive (เท่ากันเลือกค่าที่สูงกว่า) --write บันทึกค่าลง data/store_search_threshold.json ของโมเดลนี้
+"""
+import argparse
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import intent_index
+import store_index
+from catalogue import StoreCatalogue
+from logical import DATA_PATH, STORE_SEARCH_K, get_model
+
+EVAL_PATH = "data/store_search_eval.csv"
+THRESHOLDS = np.round(np.arange(0.2, 0.951, 0.025), 3)
+
+
+def load_eval(path):
+    with open(path, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    return [row["text"] for row in rows], [set(filter(None, row["stores"].split("|"))) for row in rows]
+
+
+def search_all(model, catalogue, texts, k):
+    """ร้านที่ได้ต่อข้อความแบบเดียวกับ logical.search_stores แต่ยังไม่ตัดด้วย threshold"""
+    matrix = intent_index.encode_phrases(model, catalogue.search_texts)
+    search = store_index.StoreSearch(intent_index.IntentIndex(matrix, catalogue.search_texts, catalogue.names))
+    named = [search.find_name(text) for text in texts]
+    hits = search.search(intent_index.encode_phrases(model, texts), k)
+    return [[(row, 1.0)] if row is not None else found for row, found in zip(named, hits)]
+
+
+def score(results, expected, names, threshold):
+    positives = negatives = found = false_positives = 0
+    for hits, want in zip(results, expected):
+        shown = {names[row] for row, value in hits if value >= threshold}
+        if want:
+            positives += 1
+            found += bool(shown & want)
+        else:
+            negatives += 1
+            false_positives += bool(shown)
+    return {
+        "threshold": float(threshold),
+        "accuracy": (found + negatives - false_positives) / len(expected),
+        "recall": found / max(1, positives),
+        "false_positive_rate": false_positives / max(1, negatives),
+    }
+
+
+def choose(rows, max_false_positive):
+    allowed = [row for row in rows if row["false_positive_rate"] <= max_false_positive]
+    if not allowed:
+        return rows[-1]
+    return max(allowed, key=lambda row: (row["accuracy"], row["threshold"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="เลือกคะแนนขั้นต่ำของการค้นหาร้าน")
+    parser.add_argument("--eval", default=EVAL_PATH)
+    parser.add_argument("-k", type=int, default=STORE_SEARCH_K)
+    parser.add_argument("--max-false-positive", type=float, default=0.05)
+    parser.add_argument("--write", action="store_true", help="บันทึก threshold ที่เลือกสำหรับโมเดลนี้")
+    args = parser.parse_args()
+
+    catalogue = StoreCatalogue.from_csv(DATA_PATH)
+    texts, expected = load_eval(args.eval)
+    unknown = set().union(*expected) - set(catalogue.names)
+    assert not unknown, f"ไม่มีร้านเหล่านี้ใน {DATA_PATH}: {', '.join(sorted(unknown))}"
+
+    model = get_model()
+    results = search_all(model, catalogue, texts, args.k)
+    rows = [score(results, expected, catalogue.names, threshold) for threshold in THRESHOLDS]
+
+    print(f"โมเดล {model.name} ข้อความ {len(texts)} (ไม่มีร้าน {sum(not want for want in expected)}) k={args.k}")
+    print("threshold  ถูก     เจอร้าน  ตอบร้านผิดที่")
+    for row in rows:
+        print(
+            f"{row['threshold']:9.3f}  {row['accuracy']:.3f}  {row['recall']:.3f}"
+            f"    {row['false_positive_rate']:.3f}"
+        )
+    best = choose(rows, args.max_false_positive)
+    print(
+        f"✅ เลือก threshold {best['threshold']:.3f} ถูก {best['accuracy']:.3f}"
+        f" เจอร้าน {best['recall']:.3f} ตอบร้านให้ข้อความที่ไม่มีร้าน {best['false_positive_rate']:.3f}"
+    )
+    for text, hits, want in zip(texts, results, expected):
+        shown = [(catalogue.names[row], round(value, 3)) for row, value in hits if value >= best["threshold"]]
+        if not ({name for name, _ in shown} & want if want else not shown):
+            print(f"❌ {text}: ต้องเป็น {' | '.join(sorted(want)) or 'ไม่มีร้าน'} ได้ {shown or 'ไม่มีร้าน'}")
+    if args.write:
+        store_index.save_threshold(model.name, {**best, "eval_rows": len(texts), "k": args.k})
+        print(f"💾 บันทึกลง {store_index.THRESHOLD_PATH}")
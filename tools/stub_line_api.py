@@ -0,0 +1,178 @@
+"""Stub ของ LINE Messaging API สำหรับทดสอบบนเครื่อง
+
+รัน: python tools/stub_line_api.py --port 8089
+แล้วตั้ง LINE_API_HOST=http://127.0.0.1:8089 ให้ main.py ส่งข้อความมาที่นี่แทน
+ดูข้อความที่ได้รับทั้งหมดได้ที่ GET /__messages
+
+จำลองปัญหาของ API จริงได้ด้วย --latency (หน่วงทุก request), --error-rate/--error-status
+(ตอบ error แบบสุ่ม) และ --expire-rate (สัดส่วน reply token ที่หมดอายุ)
+reply token ใช้ได้ครั้งเดียวและ push ที่ใช้ X-Line-Retry-Key ซ้ำจะได้ 409 เหมือน API จริง
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLineApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self, address, latency=0.0, error_rate=0.0, error_status=500, expire_rate=0.0, seed=None
+    ):
+        super().__init__(address, StubHandler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.expire_rate = expire_rate
+        self.injected = {}
+        self._random = random.Random(seed)
+        self._scripted = deque()
+        self._used_tokens = set()
+        self._retry_keys = set()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, path, payload):
+        with self.lock:
+            self.messages.append({"path": path, "body": payload})
+
+    def received(self):
+        with self.lock:
+            return list(self.messages)
+
+    def fail_next(self, status, count=1, path=None, retry_after=None, delay=0.0):
+        """ให้ request ถัดไป count ครั้ง (เฉพาะ path ถ้าระบุ) ตอบ status นี้
+
+        status=None กับ delay ใช้จำลอง read timeout: หน่วงก่อนแล้วค่อยตอบตามปกติ
+        """
+        with self.lock:
+            for _ in range(count):
+                self._scripted.append((status, path, retry_after, delay))
+
+    def _count(self, key):
+        self.injected[key] = self.injected.get(key, 0) + 1
+
+    def fault_for(self, path, payload, headers):
+        """คืนค่า (status, body, headers, delay) ของ error ที่จะจำลอง หรือ None ถ้าตอบปกติ"""
+        with self.lock:
+            for i, (status, only_path, retry_after, delay) in enumerate(self._scripted):
+                if only_path is None or only_path == path:
+                    del self._scripted[i]
+                    self._count(str(status or "delay"))
+                    if not status:
+                        return None, None, None, delay
+                    extra = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+                    return status, {"message": "Injected error"}, extra, delay
+            if self.error_rate and self._random.random() < self.error_rate:
+                self._count(str(self.error_status))
+                return self.error_status, {"message": "Injected error"}, {}, 0.0
+            if path == "/v2/bot/message/reply":
+                token = payload.get("replyToken")
+                expired = self.expire_rate and self._random.random() < self.expire_rate
+                if token in self._used_tokens or expired:
+                    self._count("invalid_reply_token")
+                    return 400, {"message": "Invalid reply token"}, {}, 0.0
+                self._used_tokens.add(token)
+            elif path == "/v2/bot/message/push":
+                retry_key = headers.get("X-Line-Retry-Key")
+                if retry_key and retry_key in self._retry_keys:
+                    self._count("duplicate_retry_key")
+                    return 409, {"message": "The retry key is already accepted"}, {}, 0.0
+                if retry_key:
+                    self._retry_keys.add(retry_key)
+        return None
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/__messages":
+            self._send_json(200, self.server.received())
+        else:
+            self._send_json(404, {"message": "Not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        if self.path in ("/v2/bot/message/reply", "/v2/bot/message/push"):
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            delay = 0.0
+            fault = self.server.fault_for(self.path, payload, self.headers)
+            if fault is not None and not fault[0]:
+                # หน่วงอย่างเดียว: ส่งข้อความ (และใช้ token) ไปแล้ว แต่ตอบช้าจนผู้ส่ง timeout
+                delay = fault[3]
+                fault = self.server.fault_for(self.path, payload, self.headers)
+            if fault is not None:
+                status, error, headers, fault_delay = fault
+                time.sleep(fault_delay)
+                self._send_json(status, error, headers)
+                return
+            self.server.record(self.path, payload)
+            time.sleep(delay)
+            sent = [
+                {"id": str(i), "quoteToken": f"q{i}"}
+                for i in range(len(payload.get("messages", [])))
+            ]
+            try:
+                self._send_json(200, {"sentMessages": sent})
+            except BrokenPipeError:
+                pass
+        else:
+            self._send_json(404, {"message": "Not found"})
+
+
+def start_stub(host="127.0.0.1", port=0, **faults):
+    # port=0 ให้ระบบเลือก port ว่างให้ เหมาะกับการรันในสคริปต์ทดสอบ
+    server = StubLineApi((host, port), **faults)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub LINE Messaging API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="หน่วงทุก request (วินาที)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--expire-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    server = StubLineApi(
+        (args.host, args.port),
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        expire_rate=args.expire_rate,
+        seed=args.seed,
+    )
+    print(f"🧪 Stub LINE API ที่ {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 หยุดทำงาน")